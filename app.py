@@ -1,15 +1,43 @@
-from sqlalchemy import Table, Column, Integer, Text as SQLText, MetaData, select
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy import create_engine
 from sentence_transformers import SentenceTransformer
-from typing import List, Tuple, Dict
+from typing import List, Tuple, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from collections import OrderedDict
+from uuid import uuid4
+import threading
+import random
+import base64
+import hmac
+import json
 import os
+import time
+import numpy as np
 from dotenv import load_dotenv
 from mistralai import Mistral
-from flask import Flask, jsonify, request, render_template
+from flask import Flask, jsonify, request, render_template, send_file
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
+from corpus import Corpus
+from schema import CORPORA, GITA_CORPUS, PYS_CORPUS
+from storage import create_storage
+from llm_gateway import LLMGateway, CircuitBreaker, call_timeout_ms, normalize_query
+from extractive import extractive_summary
+from prompt_builder import PRECOMPUTED_PROMPT_VERSION, build_prompt, split_passages
+from snapshot import Snapshot
+from scope_gate import ScopeGate
+from chapter_router import ChapterRouter
+from suggest import QuestionBank
+import profiling
+
+class ProfiledJSONProvider(DefaultJSONProvider):
+    """Times JSON serialization as the "serialize" stage of profiled requests"""
+
+    def response(self, *args, **kwargs):
+        with profiling.stage("serialize"):
+            return super().response(*args, **kwargs)
 
 app = Flask(__name__, static_folder='static', template_folder='templates')
+app.json = ProfiledJSONProvider(app)
 CORS(app)
 
 # Load environment variables
@@ -17,133 +45,192 @@ load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 MISTRAL_API_KEY = os.getenv("MISTRAL_API_KEY")
+# "postgres" ranks with pgvector, "embedded" reads the SQLite bundle built by data/scripts/build_bundle.py
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "postgres")
+EMBEDDED_BUNDLE = os.getenv("EMBEDDED_BUNDLE", "data/processed/texts.sqlite")
+# Embedded backend only: float32, float16 or int8 embeddings in memory, and how many
+# candidates per result are rescored exactly when quantized
+EMBEDDING_PRECISION = os.getenv("EMBEDDING_PRECISION", "float32")
+RESCORE_FACTOR = int(os.getenv("RESCORE_FACTOR", "4"))
 
-if not DATABASE_URL:
-    raise ValueError("DATABASE_URL not set in .env file")
 if not MISTRAL_API_KEY:
     raise ValueError("MISTRAL_API_KEY not set in .env file")
 
-# Initialize Mistral client
-mistral_client = Mistral(api_key=MISTRAL_API_KEY)
+# Initialize Mistral client. MISTRAL_SERVER_URL points it at another server, e.g. testing/fake_mistral.py
+mistral_client = Mistral(api_key=MISTRAL_API_KEY, server_url=os.getenv("MISTRAL_SERVER_URL"))
 MISTRAL_MODEL = "mistral-large-latest"
 
-# Initialize SQLAlchemy engine and session, this postgres:: is needed for sqlalchemy 1.4 and above
-if DATABASE_URL.startswith("postgres://"):
-    DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
-engine = create_engine(DATABASE_URL)
-Session = sessionmaker(bind=engine)
-session = Session()
+# LLM_MAX_IN_FLIGHT is the budget for the whole deployment, shared between the gunicorn workers
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+llm_gateway = LLMGateway(
+    max_in_flight=max(1, int(os.getenv("LLM_MAX_IN_FLIGHT", "4")) // WEB_CONCURRENCY),
+    max_queue=int(os.getenv("LLM_MAX_QUEUE", "16")),
+    queue_timeout=float(os.getenv("LLM_QUEUE_TIMEOUT", "5")),
+    breaker=CircuitBreaker(
+        failure_threshold=int(os.getenv("LLM_BREAKER_FAILURES", "5")),
+        reset_timeout=float(os.getenv("LLM_BREAKER_RESET", "30"))
+    )
+)
+# Latency budget of the summary stage; past it the extractive summary is returned instead
+SUMMARY_BUDGET_MS = int(os.getenv("SUMMARY_BUDGET_MS", "6000"))
+# Shortest Mistral timeout worth trying; with less of the budget left the call is skipped
+LLM_MIN_TIMEOUT_MS = int(os.getenv("LLM_MIN_TIMEOUT_MS", "1000"))
+# Input token budget of the summary prompt
+PROMPT_MAX_INPUT_TOKENS = int(os.getenv("PROMPT_MAX_INPUT_TOKENS", "700"))
+
+storage = create_storage(STORAGE_BACKEND, database_url=DATABASE_URL, bundle_path=EMBEDDED_BUNDLE,
+                         embedding_precision=EMBEDDING_PRECISION, rescore_factor=RESCORE_FACTOR)
+
+# Per-request profiling of /api/search and /api/search_pys. A request sending an X-Profile
+# header equal to PROFILE_TOKEN is profiled; without a token only sampling is available.
+# PROFILE_SAMPLE_RATE profiles that share of all their requests in the background.
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILED_ENDPOINTS = {"search", "search_pys"}
+profile_store = profiling.ProfileStore(os.getenv("PROFILE_DIR", "profiles"),
+                                       max_files=int(os.getenv("PROFILE_MAX_FILES", "200")))
+profiling.instrument_engine(storage.engine, explain_vector_queries=storage.engine.dialect.name == "postgresql")
 
-# Define the metadata and tables
-metadata = MetaData()
 model = SentenceTransformer('all-MiniLM-L6-v2')
 
-# Define tables with correct SQLAlchemy Text type
-questions_table = Table(
-    "questions",
-    metadata,
-    Column("question_id", Integer, primary_key=True),
-    Column("chapter_no", Integer),
-    Column("verse_no", Integer),
-    Column("possible_question", SQLText),
-    Column("question_embedding", SQLText)
-)
+# Rejects clearly out-of-scope queries before any vector query. Fitted by
+# data/scripts/calibrate_scope_gate.py; without the file every query takes the full path.
+SCOPE_GATE_PATH = os.getenv("SCOPE_GATE_PATH", "data/processed/scope_gate.npz")
+scope_gate = ScopeGate.load(SCOPE_GATE_PATH) if os.path.exists(SCOPE_GATE_PATH) else None
+# Share of gate rejections re-run through the full path to measure false rejections
+SCOPE_GATE_AUDIT_RATE = float(os.getenv("SCOPE_GATE_AUDIT_RATE", "0.05"))
+scope_audit_executor = ThreadPoolExecutor(max_workers=1)
 
-info_table = Table(
-    "info",
-    metadata,
-    Column("chapter_no", Integer, primary_key=True),
-    Column("verse_no", Integer, primary_key=True),
-    Column("sanskrit_verse", SQLText),
-    Column("speaker_name", SQLText),
-    Column("english_translations", SQLText),
-    Column("commentary", SQLText),
-    Column("translation_embedding", SQLText),
-    Column("commentary_embedding", SQLText)
-)
+# Two-stage Gita search: only the verses of the CHAPTER_ROUTING_TOP_N chapters closest to
+# the query are scanned. 0 scans every verse.
+CHAPTER_ROUTING_TOP_N = int(os.getenv("CHAPTER_ROUTING_TOP_N", "0"))
+CHAPTER_INTRO_WEIGHT = float(os.getenv("CHAPTER_INTRO_WEIGHT", "1.0"))
 
-chapter_table = Table(
-    "chapter",
-    metadata,
-    Column("chapter_no", Integer, primary_key=True),
-    Column("chapter_heading", SQLText),
-    Column("chapter_desc_heading", SQLText),
-    Column("chapter_intro", SQLText)
-)
+def build_chapter_router() -> ChapterRouter:
+    """
+    Builds the Gita chapter centroids from the translation and commentary embeddings of
+    info and the encoded chapter introductions, and the chapters of each speaker.
+    """
+    verse_chapters, verse_embeddings = [], []
+    for source in GITA_CORPUS.sources:
+        if source.table is GITA_CORPUS.details_table:
+            chapters, embeddings = storage.source_embeddings(source)
+            verse_chapters.append(chapters)
+            verse_embeddings.append(embeddings)
+    intros = [row for row in storage.gita_chapters() if row["chapter_intro"]]
+    speaker_chapters = {}
+    for verse in storage.gita_verses():
+        if verse["speaker_name"]:
+            speaker_chapters.setdefault(verse["speaker_name"].lower(), set()).add(verse["chapter_no"])
+    return ChapterRouter.from_embeddings(
+        verse_chapters, verse_embeddings,
+        intro_chapters=np.array([row["chapter_no"] for row in intros]),
+        intro_embeddings=model.encode([row["chapter_intro"] for row in intros]),
+        intro_weight=CHAPTER_INTRO_WEIGHT,
+        speaker_chapters=speaker_chapters
+    )
 
-pys_question_table = Table(
-    "pys_question",
-    metadata,
-    Column("question_id", Integer, primary_key=True),
-    Column("chapter_no", Integer),
-    Column("verse_no", Integer),
-    Column("sanskrit", SQLText),
-    Column("translation", SQLText),
-    Column("possible_question", SQLText),
-    Column("question_embedding", SQLText)
-)
+chapter_router = build_chapter_router() if CHAPTER_ROUTING_TOP_N > 0 else None
 
-def query_to_embedding(query: str) -> str:
+# Typeahead over the curated questions of every corpus. SUGGEST_NEIGHBOURS nearest
+# questions are kept per question; they also answer a selected Yoga Sutras suggestion,
+# so they bound its number of results.
+SUGGEST_NEIGHBOURS = int(os.getenv("SUGGEST_NEIGHBOURS", "20"))
+
+def build_question_bank() -> QuestionBank:
+    """
+    Builds the suggestion index from the stored questions and their embeddings.
+    """
+    questions, embeddings = [], []
+    for corpus in CORPORA.values():
+        rows, matrix = storage.question_bank(corpus)
+        questions.extend({"corpus": corpus.name, **row} for row in rows)
+        embeddings.append(matrix)
+    return QuestionBank(questions, np.vstack(embeddings), neighbours=SUGGEST_NEIGHBOURS)
+
+question_bank = build_question_bank()
+
+# Runs the per-corpus searches of /api/search_all side by side
+search_executor = ThreadPoolExecutor(max_workers=len(CORPORA))
+
+# Personalized summaries generated after a precomputed summary was returned, by id.
+# They live in the worker that started them, so clients should poll with sticky sessions.
+personalize_executor = ThreadPoolExecutor(max_workers=2)
+personalized_summaries = OrderedDict()
+personalized_summaries_lock = threading.Lock()
+MAX_PERSONALIZED_SUMMARIES = 1000
+
+def encode_query(query: str) -> np.ndarray:
+    """
+    Encodes a user query with the sentence transformer.
+    """
+    with profiling.stage("encode"):
+        return model.encode(query)
+
+def parse_search_filters(payload: Dict) -> Dict:
     """
-    Converts a user query into a vector embedding.
+    Reads the optional metadata filters from a search request body.
+
+    Args:
+        payload (Dict): The JSON body of the request. Accepts "chapter_no" as a single
+            chapter (2) or an inclusive range ([2, 4]) and "speaker_name" as a string.
+
+    Returns:
+        Dict: Keyword arguments for the search functions (chapter_range, speaker_name)
+
+    Raises:
+        ValueError: If a filter is malformed
     """
-    embedding = model.encode(query)
-    return "[" + ",".join(map(str, embedding)) + "]"
+    filters = {"chapter_range": None, "speaker_name": None}
+
+    chapter_no = payload.get("chapter_no")
+    if chapter_no is not None:
+        if isinstance(chapter_no, list):
+            if len(chapter_no) != 2:
+                raise ValueError("chapter_no range must be [start, end]")
+            start, end = chapter_no
+        else:
+            start = end = chapter_no
+        if isinstance(start, bool) or isinstance(end, bool) \
+                or not isinstance(start, int) or not isinstance(end, int):
+            raise ValueError("chapter_no must be an integer or a [start, end] pair of integers")
+        if start > end:
+            raise ValueError("chapter_no range start must not be greater than its end")
+        filters["chapter_range"] = (start, end)
 
-def search_across_embeddings(query: str, limit: int = 5) -> List[Tuple[int, int, float, str]]:
+    speaker_name = payload.get("speaker_name")
+    if speaker_name is not None:
+        if not isinstance(speaker_name, str) or not speaker_name.strip():
+            raise ValueError("speaker_name must be a non-empty string")
+        filters["speaker_name"] = speaker_name.strip()
+
+    return filters
+
+def search_across_embeddings(query: str, limit: int = 5,
+                             chapter_range: Optional[Tuple[int, int]] = None,
+                             speaker_name: Optional[str] = None,
+                             query_vector: Optional[np.ndarray] = None) -> List[Tuple[int, int, float, str]]:
     """
     Searches for the most similar content across questions, translations, and commentaries.
+    With CHAPTER_ROUTING_TOP_N set, only the verses of the closest chapters are searched.
     
     Args:
         query (str): The user's query
         limit (int): Number of results to return per embedding type
+        chapter_range (Tuple[int, int], optional): Inclusive (start, end) chapters to search in
+        speaker_name (str, optional): Only match verses spoken by this speaker
+        query_vector (np.ndarray, optional): Output of encode_query, when the caller already has it
     
     Returns:
         List[Tuple[int, int, float, str]]: List of (chapter_no, verse_no, similarity_score, source)
     """
-    query_embedding = query_to_embedding(query)
-    results = []
-    
-    # Search in questions
-    question_query = select(
-        questions_table.c.chapter_no,
-        questions_table.c.verse_no,
-        (questions_table.c.question_embedding.op('<=>')(query_embedding)).label("similarity")
-    ).order_by(
-        questions_table.c.question_embedding.op('<=>')(query_embedding)
-    ).limit(limit)
-    
-    question_results = [(r[0], r[1], r[2], 'question') for r in session.execute(question_query)]
-    results.extend(question_results)
-    
-    # Search in translations
-    translation_query = select(
-        info_table.c.chapter_no,
-        info_table.c.verse_no,
-        (info_table.c.translation_embedding.op('<=>')(query_embedding)).label("similarity")
-    ).order_by(
-        info_table.c.translation_embedding.op('<=>')(query_embedding)
-    ).limit(limit)
-    
-    translation_results = [(r[0], r[1], r[2], 'translation') for r in session.execute(translation_query)]
-    results.extend(translation_results)
-    
-    # Search in commentaries
-    commentary_query = select(
-        info_table.c.chapter_no,
-        info_table.c.verse_no,
-        (info_table.c.commentary_embedding.op('<=>')(query_embedding)).label("similarity")
-    ).order_by(
-        info_table.c.commentary_embedding.op('<=>')(query_embedding)
-    ).limit(limit)
-    
-    commentary_results = [(r[0], r[1], r[2], 'commentary') for r in session.execute(commentary_query)]
-    results.extend(commentary_results)
-    
-    # Sort all results by similarity score
-    results.sort(key=lambda x: x[2])
-    
-    return results
+    if query_vector is None:
+        query_vector = encode_query(query)
+    chapters = None
+    if chapter_router is not None:
+        chapters = chapter_router.top_chapters(query_vector, CHAPTER_ROUTING_TOP_N, chapter_range, speaker_name)
+    with profiling.stage("search"):
+        return storage.rank(GITA_CORPUS, query_vector, limit, chapter_range, speaker_name, chapters)
 
 def get_verse_details(chapter_no: int, verse_no: int) -> Dict:
     """
@@ -156,35 +243,22 @@ def get_verse_details(chapter_no: int, verse_no: int) -> Dict:
     Returns:
         Dict: Verse details including sanskrit verse, speaker, and translation
     """
-    query = select(
-        info_table.c.sanskrit_verse,
-        info_table.c.speaker_name,
-        info_table.c.english_translations,
-        info_table.c.commentary
-    ).where(
-        (info_table.c.chapter_no == chapter_no) &
-        (info_table.c.verse_no == verse_no)
-    )
-    
-    result = session.execute(query).first()
-    if result:
-        return {
-            "chapter_no": chapter_no,
-            "verse_no": verse_no,
-            "sanskrit_verse": result[0],
-            "speaker": result[1],
-            "translation": result[2],
-            "commentary": result[3]
-        }
+    with profiling.stage("verse_details"):
+        details = storage.verse_details(GITA_CORPUS, chapter_no, verse_no)
+    if details:
+        return {"chapter_no": chapter_no, "verse_no": verse_no, **details}
     return None
 
 SIMILARITY_THRESHOLD = 0.5
-def get_best_match_with_details(query: str) -> Dict:
+def get_best_match_with_details(query: str, chapter_range: Optional[Tuple[int, int]] = None,
+                                speaker_name: Optional[str] = None,
+                                query_vector: Optional[np.ndarray] = None) -> Dict:
     """
     Gets the single best matching verse across all embedding types along with its details.
     Filters out results with similarity scores above the threshold.
     """
-    results = search_across_embeddings(query, limit=1)
+    results = search_across_embeddings(query, limit=1, chapter_range=chapter_range,
+                                       speaker_name=speaker_name, query_vector=query_vector)
     if not results:
         return None
         
@@ -207,32 +281,83 @@ def get_best_match_with_details(query: str) -> Dict:
         })
     return verse_details
 
-def generate_verse_summary(translation: str, commentary: str, query: str) -> str:
+def get_suggested_match(question_row: int, chapter_range: Optional[Tuple[int, int]] = None,
+                        speaker_name: Optional[str] = None) -> Tuple[str, np.ndarray, Optional[Dict]]:
+    """
+    Answers a selected Gita suggestion with the verse its question was written for, which
+    is what a search with the question's own embedding returns, without encoding or
+    ranking anything. When that verse does not pass the filters, the best match that does
+    is searched for with the stored embedding.
+
+    Returns:
+        Tuple[str, np.ndarray, Optional[Dict]]: The question, its stored embedding and the
+            match in the shape of get_best_match_with_details
+    """
+    question = question_bank.questions[question_row]
+    query, query_vector = question["question"], question_bank.embeddings[question_row]
+    in_range = not chapter_range or chapter_range[0] <= question["chapter_no"] <= chapter_range[1]
+    verse_details = get_verse_details(question["chapter_no"], question["verse_no"]) if in_range else None
+    if verse_details and speaker_name and (verse_details["speaker"] or "").lower() != speaker_name.lower():
+        verse_details = None
+    if verse_details is None:
+        return query, query_vector, get_best_match_with_details(query, chapter_range, speaker_name, query_vector)
+
+    verse_details.update({
+        "is_irrelevant": False,
+        "similarity_score": 0.0,
+        "match_source": "question"
+    })
+    return query, query_vector, verse_details
+
+def count_tokens(text: str) -> int:
     """
-    Generates a summary of the verse using Mistral AI.
+    Approximates the Mistral token count of a text with the MiniLM WordPiece tokenizer,
+    which splits English prose into a similar number of pieces.
+    """
+    return len(model.tokenizer.tokenize(text))
+
+@lru_cache(maxsize=512)
+def encode_commentary_passages(commentary: str) -> Tuple[List[str], np.ndarray]:
+    """
+    Splits a commentary into passages and embeds them. Cached, since the corpus is fixed
+    and popular verses are summarized over and over.
+    """
+    passages = split_passages(commentary)
+    return passages, model.encode(passages)
+
+def generate_verse_summary(translation: str, commentary: str, query: str,
+                           deadline: Optional[float] = None,
+                           query_vector: Optional[np.ndarray] = None) -> str:
+    """
+    Generates a summary of the verse using Mistral AI. Commentaries that would push the
+    prompt over PROMPT_MAX_INPUT_TOKENS are cut down to their most relevant passages.
     
     Args:
         translation (str): English translation of the verse
         commentary (str): Commentary on the verse
         query (str): The user's original question
+        deadline (float, optional): time.monotonic() by which Mistral must have answered
+        query_vector (np.ndarray, optional): Output of encode_query, when the caller already has it
     
     Returns:
         str: Generated summary
-    """
-    prompt = f"""Given this verse from the Bhagavad Gita and user's question:
-
-User's Question:
-{query}
 
-Translation:
-{translation}
-
-Commentary:
-{commentary}
-
-Please provide a concise summary (5-6 sentences) of the main teaching or message from this verse, addressing the user's question if relevant meaning, connect the dots of user's query with the learnings of Bhagwad Gita to guide the user."""
+    Raises:
+        DeadlineExceeded: If less than LLM_MIN_TIMEOUT_MS is left once the prompt is built
+        Exception: Whatever the Mistral client raises on errors and timeouts
+    """
+    if query_vector is None:
+        query_vector = encode_query(query)
+    prompt, prompt_stats = build_prompt(query, translation, commentary, query_vector,
+                                        encode_passages=encode_commentary_passages,
+                                        count_tokens=count_tokens,
+                                        max_input_tokens=PROMPT_MAX_INPUT_TOKENS)
+    app.logger.info("Summary prompt %s: %d tokens before budgeting, %d sent",
+                    prompt_stats["prompt_version"], prompt_stats["tokens_before"], prompt_stats["tokens_after"])
 
-    try:
+    # After build_prompt, which may encode commentary passages
+    timeout_ms = call_timeout_ms(deadline, LLM_MIN_TIMEOUT_MS)
+    with profiling.stage("llm"):
         response = mistral_client.chat.complete(
             model=MISTRAL_MODEL,
             messages=[
@@ -240,47 +365,357 @@ Please provide a concise summary (5-6 sentences) of the main teaching or message
                     "role": "user",
                     "content": prompt,
                 }
-            ]
+            ],
+            timeout_ms=timeout_ms
         )
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-        return "Summary generation failed. Please refer to the translation and commentary above."
-    
-def search_pys_questions(query: str, limit: int = 5) -> List[Dict]:
+    return response.choices[0].message.content.strip()
+
+def encode_cursor(similarity: float, chapter_no: int, verse_no: int) -> str:
+    """Encodes the sort key of the last returned row as an opaque pagination cursor"""
+    return base64.urlsafe_b64encode(json.dumps([similarity, chapter_no, verse_no]).encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[float, int, int]:
+    """
+    Reverses encode_cursor.
+
+    Raises:
+        ValueError: If the cursor was not produced by encode_cursor
+    """
+    try:
+        similarity, chapter_no, verse_no = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return float(similarity), int(chapter_no), int(verse_no)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def summarize_match(result: Dict, query: str, query_vector: np.ndarray) -> Tuple[str, str]:
+    """
+    Summarizes a matched verse within SUMMARY_BUDGET_MS. The Mistral summary goes through
+    the LLM gateway, so that identical concurrent questions about the same verse share one
+    generation. When the gateway sheds the request, the budget runs out, the breaker is
+    open or Mistral fails, an extractive summary is built locally instead.
+
+    Returns:
+        Tuple[str, str]: The summary and how it was made ("llm" or "extractive")
+    """
+    deadline = time.monotonic() + SUMMARY_BUDGET_MS / 1000
+
+    def generate():
+        return generate_verse_summary(result['translation'], result['commentary'], query,
+                                      deadline=deadline, query_vector=query_vector)
+
+    key = (result['chapter_no'], result['verse_no'], normalize_query(query))
+    try:
+        with profiling.stage("summary"):
+            return llm_gateway.run(key, generate, deadline=deadline), "llm"
+    except Exception:
+        with profiling.stage("extractive_summary"):
+            summary = extractive_summary(query, query_vector, result['translation'], result['commentary'],
+                                         encode=model.encode)
+        return summary, "extractive"
+
+def get_precomputed_summary(corpus_name: str, chapter_no: int, verse_no: int) -> Optional[str]:
+    """
+    Fetches the query-independent summary stored by data/scripts/precompute_summaries.py
+    for the current PRECOMPUTED_PROMPT_VERSION, or None when there is none yet.
+    """
+    return storage.precomputed_summary(corpus_name, chapter_no, verse_no, PRECOMPUTED_PROMPT_VERSION)
+
+def start_personalized_summary(result: Dict, query: str, query_vector: np.ndarray) -> str:
+    """
+    Generates the question-specific summary of a verse in the background.
+
+    Returns:
+        str: Id to poll /api/summary/<id> with
     """
-    Searches for similar questions in the pys_question table using vector embeddings.
+    summary_id = uuid4().hex
+    with personalized_summaries_lock:
+        personalized_summaries[summary_id] = {"status": "pending"}
+        while len(personalized_summaries) > MAX_PERSONALIZED_SUMMARIES:
+            personalized_summaries.popitem(last=False)
+
+    def personalize():
+        summary, source = summarize_match(result, query, query_vector)
+        with personalized_summaries_lock:
+            if summary_id in personalized_summaries:
+                personalized_summaries[summary_id] = {
+                    "status": "done",
+                    "summary": summary,
+                    "summary_source": source
+                }
+
+    personalize_executor.submit(personalize)
+    return summary_id
+
+def search_pys_questions(query: str, limit: int = 5,
+                         chapter_range: Optional[Tuple[int, int]] = None,
+                         cursor: Optional[str] = None,
+                         query_vector: Optional[np.ndarray] = None) -> Tuple[List[Dict], Optional[str]]:
+    """
+    Searches for similar questions in the pys_question table using vector embeddings and
+    returns the closest distinct sutras. Several questions can map to the same sutra, so
+    each sutra is ranked by its best matching question inside the query and only the
+    final page of rows carries the text columns.
     
     Args:
         query (str): The user's query
-        limit (int): Number of results to return
+        limit (int): Number of distinct sutras to return
+        chapter_range (Tuple[int, int], optional): Inclusive (start, end) padas to search in
+        cursor (str, optional): next_cursor of the previous page
+        query_vector (np.ndarray, optional): Output of encode_query, when the caller already has it
     
     Returns:
-        List[Dict]: List of matching verses with their details
+        Tuple[List[Dict], Optional[str]]: Matching sutras best first, and the cursor of the
+            next page (None when there are no more results)
     """
-    query_embedding = query_to_embedding(query)
-    
-    # Search in pys_questions
-    search_query = select(
-        pys_question_table.c.chapter_no,
-        pys_question_table.c.verse_no,
-        pys_question_table.c.sanskrit,
-        pys_question_table.c.translation,
-        pys_question_table.c.possible_question,
-        (pys_question_table.c.question_embedding.op('<=>')(query_embedding)).label("similarity")
-    ).order_by(
-        pys_question_table.c.question_embedding.op('<=>')(query_embedding)
-    ).limit(limit)
-    
+    if query_vector is None:
+        query_vector = encode_query(query)
+    after = decode_cursor(cursor) if cursor else None
+    with profiling.stage("search"):
+        # One row more than the page tells whether there is a next one. The cursor's own
+        # sutra may come back once too: a cursor from suggested_pys_results carries a
+        # distance computed by NumPy, which can differ from the database's in the last bit
+        results = storage.search_pys(query_vector, limit + 2 if after else limit + 1, chapter_range, after)
+    if after:
+        results = [r for r in results if (r["chapter_no"], r["verse_no"]) != after[1:]]
+    return page_with_cursor(results, limit)
+
+def page_with_cursor(results: List[Dict], limit: int) -> Tuple[List[Dict], Optional[str]]:
+    """
+    Cuts up to limit + 1 sutras down to a page, with a cursor only when the extra sutra
+    shows that a next page exists.
+    """
+    next_cursor = None
+    if len(results) > limit:
+        last = results[limit - 1]
+        next_cursor = encode_cursor(last["similarity_score"], last["chapter_no"], last["verse_no"])
+    return results[:limit], next_cursor
+
+def suggested_pys_results(question_row: int, limit: int = 5,
+                          chapter_range: Optional[Tuple[int, int]] = None) -> Optional[Tuple[List[Dict], Optional[str]]]:
+    """
+    Answers the first page of a selected Yoga Sutras suggestion from the precomputed
+    neighbours of its question, in the shape of search_pys_questions. Returns None when
+    the neighbours cannot fill the page, so that the caller searches with the question's
+    stored embedding instead. Later pages go through search_pys_questions too.
+    """
+    answers = question_bank.related_verses(question_row, limit + 1, chapter_range)
+    if answers is None:
+        return None
     results = []
-    for row in session.execute(search_query):
+    for row, distance in answers:
+        question = question_bank.questions[row]
         results.append({
-            "chapter_no": row.chapter_no,
-            "verse_no": row.verse_no,
-            "sanskrit": row.sanskrit,
-            "translation": row.translation,
+            "chapter_no": question["chapter_no"],
+            "verse_no": question["verse_no"],
+            "sanskrit": question["sanskrit"],
+            "translation": question["translation"],
+            "matched_question": question["question"],
+            "similarity_score": distance
         })
-    
-    return results[0]
+    return page_with_cursor(results, limit)
+
+def parse_question_id(payload: Dict, corpus: Corpus) -> Optional[int]:
+    """
+    Reads the question_id of a selected suggestion from a search request.
+
+    Returns:
+        Optional[int]: The question's row in question_bank, or None without a question_id
+
+    Raises:
+        ValueError: If question_id is not a question of the corpus
+    """
+    question_id = payload.get('question_id')
+    if question_id is None:
+        return None
+    row = None
+    if isinstance(question_id, int) and not isinstance(question_id, bool):
+        row = question_bank.lookup(corpus.name, question_id)
+    if row is None:
+        raise ValueError(f"question_id is not a suggested question of the {corpus.title}")
+    return row
+
+def find_corpus_matches(corpus: Corpus, query_vector: np.ndarray, limit: int = 3) -> List[Dict]:
+    """
+    Finds the best distinct verses of one corpus that pass SIMILARITY_THRESHOLD.
+    Storage calls open their own sessions, so several corpora can be searched concurrently.
+
+    Returns:
+        List[Dict]: Matches with chapter_no, verse_no, similarity_score, match_source and
+            the corpus detail columns, best first
+    """
+    matches = []
+    seen = set()
+    for chapter_no, verse_no, similarity, source in storage.rank(corpus, query_vector, limit):
+        if similarity > SIMILARITY_THRESHOLD or len(matches) == limit:
+            break
+        if (chapter_no, verse_no) in seen:
+            continue
+        seen.add((chapter_no, verse_no))
+
+        match = {
+            "chapter_no": chapter_no,
+            "verse_no": verse_no,
+            "similarity_score": similarity,
+            "match_source": source
+        }
+        details = storage.verse_details(corpus, chapter_no, verse_no)
+        if details:
+            match.update(details)
+        matches.append(match)
+    return matches
+
+def search_all_corpora(query: str, corpus_names: List[str], limit: int = 3,
+                       query_vector: Optional[np.ndarray] = None) -> Dict[str, List[Dict]]:
+    """
+    Encodes the query once and searches the given corpora concurrently.
+
+    Args:
+        query (str): The user's query
+        corpus_names (List[str]): Keys of CORPORA to search
+        limit (int): Maximum number of distinct verses per corpus
+        query_vector (np.ndarray, optional): Output of encode_query, when the caller already has it
+
+    Returns:
+        Dict[str, List[Dict]]: Corpus name -> matches from find_corpus_matches
+    """
+    if query_vector is None:
+        query_vector = encode_query(query)
+    futures = {
+        name: search_executor.submit(find_corpus_matches, CORPORA[name], query_vector, limit)
+        for name in corpus_names
+    }
+    return {name: future.result() for name, future in futures.items()}
+
+def out_of_scope(query_vector: np.ndarray, corpus_names: List[str], full_path) -> bool:
+    """
+    Asks the scope gate whether a query can be answered from the given corpora. A sample
+    of the rejections is re-run through full_path in the background, which returns
+    whether the full search would have found the query irrelevant too.
+    """
+    if scope_gate is None or scope_gate.in_scope(query_vector, corpus_names):
+        return False
+    if random.random() < SCOPE_GATE_AUDIT_RATE:
+        scope_audit_executor.submit(lambda: scope_gate.record_audit(full_path()))
+    return True
+
+def record_full_path(irrelevant: bool):
+    """Records the full path's verdict on a query the scope gate let through"""
+    if scope_gate is not None:
+        scope_gate.record_passed(irrelevant)
+
+def irrelevant_response():
+    """Response returned when a query does not match any sacred text closely enough"""
+    return jsonify({
+        'is_irrelevant': True,
+        'message': 'Your question seems to be outside the scope of the sacred texts. Please ask questions about the Bhagavad Gita or Patanjali Yoga Sutras.',
+        'examples': [
+            'How did Bhagavad Gita start?',
+            'What is the importance of karma yoga?',
+            'What are the eight limbs of yoga?',
+            'How can I achieve peace of mind according to Krishna?'
+        ]
+    })
+
+# Cache lifetime of the read-only verse and chapter API. The texts only change on reseeding.
+READ_API_CACHE_CONTROL = os.getenv("READ_API_CACHE_CONTROL", "public, max-age=86400, stale-while-revalidate=604800")
+
+def load_text_snapshot() -> Snapshot:
+    """
+    Loads every Gita verse and chapter and every Yoga Sutra into memory as ready-to-serve
+    JSON documents for the read-only API.
+    """
+    snapshot = Snapshot()
+
+    gita_chapters = {}
+    for row in storage.gita_verses():
+        snapshot.add(("gita", "verse", row["chapter_no"], row["verse_no"]), {
+            "chapter_no": row["chapter_no"],
+            "verse_no": row["verse_no"],
+            "sanskrit_verse": row["sanskrit_verse"],
+            "speaker": row["speaker_name"],
+            "translation": row["english_translations"],
+            "commentary": row["commentary"]
+        })
+        gita_chapters.setdefault(row["chapter_no"], []).append(row["verse_no"])
+
+    for row in storage.gita_chapters():
+        snapshot.add(("gita", "chapter", row["chapter_no"]), {
+            "chapter_no": row["chapter_no"],
+            "chapter_heading": row["chapter_heading"],
+            "chapter_desc_heading": row["chapter_desc_heading"],
+            "chapter_intro": row["chapter_intro"],
+            "verses": gita_chapters.get(row["chapter_no"], [])
+        })
+
+    pys_chapters = {}
+    for sutra in storage.pys_sutras():
+        pys_chapters.setdefault(sutra["chapter_no"], []).append(sutra)
+        snapshot.add(("pys", "verse", sutra["chapter_no"], sutra["verse_no"]), sutra)
+
+    for chapter_no, sutra_list in pys_chapters.items():
+        snapshot.add(("pys", "chapter", chapter_no), {
+            "chapter_no": chapter_no,
+            "verses": [
+                {"verse_no": sutra["verse_no"], "sanskrit": sutra["sanskrit"], "translation": sutra["translation"]}
+                for sutra in sutra_list
+            ]
+        })
+
+    return snapshot
+
+text_snapshot = load_text_snapshot()
+
+def serve_snapshot(key):
+    """Serves a snapshot resource with ETag, Cache-Control and compression, or a 404"""
+    resource = text_snapshot.get(key)
+    if resource is None:
+        return jsonify({'error': 'Not found'}), 404
+    return resource.response(request, READ_API_CACHE_CONTROL)
+
+def profile_token_matches(token: Optional[str]) -> bool:
+    """Compares a client token with PROFILE_TOKEN in constant time"""
+    if not PROFILE_TOKEN or token is None:
+        return False
+    return hmac.compare_digest(token.encode(), PROFILE_TOKEN.encode())
+
+@app.before_request
+def start_request_profile():
+    """Profiles this request when it asks for it with the token or is sampled"""
+    if request.endpoint not in PROFILED_ENDPOINTS:
+        return
+    if profile_token_matches(request.headers.get("X-Profile")):
+        reason = "requested"
+    elif PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE:
+        reason = "sampled"
+    else:
+        return
+    profile = profiling.RequestProfile(request.endpoint, reason)
+    request.environ["profile"] = (profile, profile.start())
+
+@app.after_request
+def finish_request_profile(response):
+    profiled = request.environ.pop("profile", None)
+    if profiled:
+        profile, token = profiled
+        profile.stop(token)
+        try:
+            profiling.explain_queries(profile, storage.engine)
+            profile_store.save(profile)
+        except OSError:
+            app.logger.exception("Could not save profile %s", profile.id)
+            return response
+        # Sampled requests are profiled silently
+        if profile.reason == "requested":
+            response.headers["X-Profile-Id"] = profile.id
+            response.headers["X-Profile-Url"] = f"/api/profiles/{profile.id}"
+    return response
+
+@app.teardown_request
+def discard_request_profile(error):
+    """Stops the profiler of a request that failed before after_request ran"""
+    profiled = request.environ.pop("profile", None)
+    if profiled:
+        profiled[0].stop(profiled[1])
 
 @app.route('/')
 def index():
@@ -290,27 +725,48 @@ def index():
 @app.route('/api/search', methods=['POST'])
 def search():
     try:
+        try:
+            question_row = parse_question_id(request.json, GITA_CORPUS)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
         query = request.json.get('query')
-        if not query:
+        if not query and question_row is None:
             return jsonify({'error': 'Query is required'}), 400
-            
-        result = get_best_match_with_details(query)
+
+        try:
+            filters = parse_search_filters(request.json)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        summary_mode = request.json.get('summary_mode', 'live')
+        if summary_mode not in ('live', 'precomputed'):
+            return jsonify({'error': "summary_mode must be 'live' or 'precomputed'"}), 400
+
+        if question_row is not None:
+            query, query_vector, result = get_suggested_match(question_row, **filters)
+        else:
+            query_vector = encode_query(query)
+            full_path = lambda: get_best_match_with_details(query, query_vector=query_vector, **filters)
+            if out_of_scope(query_vector, ["gita"], lambda: (full_path() or {}).get("is_irrelevant", True)):
+                return irrelevant_response()
+
+            result = full_path()
+            record_full_path(not result or result.get("is_irrelevant", False))
         if result:
             if result.get("is_irrelevant"):
-                return jsonify({
-                    'is_irrelevant': True,
-                    'message': 'Your question seems to be outside the scope of the sacred texts. Please ask questions about the Bhagavad Gita or Patanjali Yoga Sutras.',
-                    'examples': [
-                        'How did Bhagavad Gita start?',
-                        'What is the importance of karma yoga?',
-                        'What are the eight limbs of yoga?',
-                        'How can I achieve peace of mind according to Krishna?'
-                    ]
-                })
+                return irrelevant_response()
+
+            if summary_mode == 'precomputed':
+                summary = get_precomputed_summary('gita', result['chapter_no'], result['verse_no'])
+                if summary:
+                    result['summary'], result['summary_source'] = summary, 'precomputed'
+                    if request.json.get('personalize'):
+                        result['personalized_summary_id'] = start_personalized_summary(result, query, query_vector)
+                    return jsonify(result)
             
-            # Updated to pass query to generate_verse_summary
-            summary = generate_verse_summary(result['translation'], result['commentary'], query)
-            result['summary'] = summary
+            # Falls back to an extractive summary rather than waiting past the budget
+            result['summary'], result['summary_source'] = summarize_match(result, query, query_vector)
             return jsonify(result)
         return jsonify({'error': 'No matching verses found'}), 404
             
@@ -320,17 +776,180 @@ def search():
 @app.route('/api/search_pys', methods=['POST'])
 def search_pys():
     try:
+        try:
+            question_row = parse_question_id(request.json, PYS_CORPUS)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
         query = request.json.get('query')
-        if not query:
+        if not query and question_row is None:
             return jsonify({'error': 'Query is required'}), 400
+
+        try:
+            filters = parse_search_filters(request.json)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if filters["speaker_name"]:
+            return jsonify({'error': 'speaker_name is not available for the Yoga Sutras'}), 400
             
-        results = search_pys_questions(query, limit=5)  # You can adjust the limit as needed
-        if results:
-            return jsonify(results)
+        limit = request.json.get('limit', 5)
+        if isinstance(limit, bool) or not isinstance(limit, int) or not 1 <= limit <= 20:
+            return jsonify({'error': 'limit must be an integer between 1 and 20'}), 400
+
+        cursor = request.json.get('cursor')
+        if question_row is not None:
+            # A selected suggestion: the first page usually comes from the neighbours of its
+            # question, anything else from a search with its stored embedding
+            if not cursor:
+                answer = suggested_pys_results(question_row, limit, filters["chapter_range"])
+                if answer is not None:
+                    results, next_cursor = answer
+                    return jsonify({'results': results, 'next_cursor': next_cursor})
+            query = question_bank.questions[question_row]["question"]
+            query_vector = question_bank.embeddings[question_row]
+        else:
+            query_vector = encode_query(query)
+        # Not gated: this endpoint returns the closest sutras without a relevance cut, so
+        # the scope gate would reject queries the search itself answers
+        try:
+            results, next_cursor = search_pys_questions(query, limit=limit, chapter_range=filters["chapter_range"],
+                                                        cursor=cursor, query_vector=query_vector)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        # Following a cursor past the last sutra gives an empty page, not a missing one
+        if results or cursor:
+            return jsonify({'results': results, 'next_cursor': next_cursor})
         return jsonify({'error': 'No matching verses found'}), 404
             
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/search_all', methods=['POST'])
+def search_all():
+    try:
+        query = request.json.get('query')
+        if not query:
+            return jsonify({'error': 'Query is required'}), 400
+
+        corpus_names = request.json.get('corpora') or list(CORPORA)
+        if not isinstance(corpus_names, list) or not all(isinstance(name, str) for name in corpus_names):
+            return jsonify({'error': 'corpora must be a list of corpus names'}), 400
+        unknown = [name for name in corpus_names if name not in CORPORA]
+        if unknown:
+            return jsonify({'error': f"Unknown corpora: {', '.join(map(str, unknown))}"}), 400
+        # Each corpus is searched and reported once, in the order first asked for
+        corpus_names = list(dict.fromkeys(corpus_names))
+
+        limit = request.json.get('limit', 3)
+        if isinstance(limit, bool) or not isinstance(limit, int) or not 1 <= limit <= 10:
+            return jsonify({'error': 'limit must be an integer between 1 and 10'}), 400
+
+        query_vector = encode_query(query)
+        full_path = lambda: search_all_corpora(query, corpus_names, limit=limit, query_vector=query_vector)
+        if out_of_scope(query_vector, corpus_names, lambda: not any(full_path().values())):
+            return irrelevant_response()
+
+        matches = full_path()
+        record_full_path(not any(matches.values()))
+        if not any(matches.values()):
+            return irrelevant_response()
+
+        return jsonify({
+            'is_irrelevant': False,
+            'results': [
+                {
+                    'corpus': name,
+                    'title': CORPORA[name].title,
+                    'matches': matches[name]
+                }
+                for name in corpus_names
+            ]
+        })
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/verse/<int:chapter_no>/<int:verse_no>')
+def gita_verse(chapter_no, verse_no):
+    return serve_snapshot(("gita", "verse", chapter_no, verse_no))
+
+@app.route('/api/chapter/<int:chapter_no>')
+def gita_chapter(chapter_no):
+    return serve_snapshot(("gita", "chapter", chapter_no))
+
+@app.route('/api/pys/verse/<int:chapter_no>/<int:verse_no>')
+def pys_verse(chapter_no, verse_no):
+    return serve_snapshot(("pys", "verse", chapter_no, verse_no))
+
+@app.route('/api/pys/chapter/<int:chapter_no>')
+def pys_chapter(chapter_no):
+    return serve_snapshot(("pys", "chapter", chapter_no))
+
+@app.route('/api/summary/<summary_id>')
+def personalized_summary(summary_id):
+    """Status of a personalized summary started by /api/search with personalize set"""
+    with personalized_summaries_lock:
+        summary = personalized_summaries.get(summary_id)
+    if summary is None:
+        return jsonify({'error': 'Unknown summary id'}), 404
+    return jsonify(summary)
+
+@app.route('/api/suggest')
+def suggest():
+    """
+    Ranked questions from the question bank for a partially typed query. Pass the
+    question_id of the chosen one to /api/search or /api/search_pys (by its corpus).
+    """
+    corpus = request.args.get('corpus')
+    if corpus is not None and corpus not in CORPORA:
+        return jsonify({'error': f"Unknown corpus: {corpus}"}), 400
+    limit = request.args.get('limit', 8, type=int)
+    if not 1 <= limit <= 20:
+        return jsonify({'error': 'limit must be an integer between 1 and 20'}), 400
+    response = jsonify({'suggestions': question_bank.suggest(request.args.get('q', ''), corpus, limit)})
+    # Suggestions only change with the question bank
+    response.headers['Cache-Control'] = READ_API_CACHE_CONTROL
+    return response
+
+@app.route('/api/llm_gateway/stats')
+def llm_gateway_stats():
+    """Queue depth, in-flight generations and queue wait times of this worker"""
+    return jsonify(llm_gateway.stats())
+
+@app.route('/api/scope_gate/stats')
+def scope_gate_stats():
+    """How often the scope gate fires and disagrees with the full path in this worker"""
+    if scope_gate is None:
+        return jsonify({'error': 'Scope gate not configured'}), 404
+    return jsonify(scope_gate.stats())
+
+def profile_access_allowed() -> bool:
+    # Header only: a token in the query string would end up in access logs and history
+    return profile_token_matches(request.headers.get("X-Profile"))
+
+@app.route('/api/profiles')
+def list_profiles():
+    """Saved request profiles of this worker, newest first"""
+    if not profile_access_allowed():
+        return jsonify({'error': 'Forbidden'}), 403
+    return jsonify(profile_store.list())
+
+@app.route('/api/profiles/<name>')
+def download_profile(name):
+    """
+    The JSON report of a profiled request (stages, SQL with query plans, top functions),
+    or with the .prof extension its cProfile dump for pstats or snakeviz.
+    """
+    if not profile_access_allowed():
+        return jsonify({'error': 'Forbidden'}), 403
+    profile_id, _, extension = name.partition(".")
+    extension = extension or "json"
+    path = profile_store.path(profile_id, extension) if extension in ("json", "prof") else None
+    if path is None:
+        return jsonify({'error': 'Unknown profile'}), 404
+    return send_file(os.path.abspath(path), as_attachment=extension == "prof",
+                     mimetype="application/json" if extension == "json" else "application/octet-stream")
+
 if __name__ == "__main__":
     app.run(debug=True, port=5000)
\ No newline at end of file
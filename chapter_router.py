@@ -0,0 +1,75 @@
+"""
+Coarse first stage of the two-stage search: ranks chapter centroids against the query
+so that the vector search only scans the verses of the closest chapters.
+
+A chapter centroid is the mean of its verses' normalized embeddings, blended with the
+embedding of the chapter introduction.
+"""
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from scope_gate import normalize
+
+
+class ChapterRouter:
+    """
+    Args:
+        chapters (np.ndarray): chapter_no of each centroid
+        centroids (np.ndarray): (chapters, dim) centroid embeddings
+        speaker_chapters (Dict[str, Set[int]], optional): Lower-cased speaker name -> the
+            chapters with a verse by that speaker, so that a speaker filter is only routed
+            to chapters where it can match
+    """
+
+    def __init__(self, chapters: np.ndarray, centroids: np.ndarray,
+                 speaker_chapters: Optional[Dict[str, Set[int]]] = None):
+        self.chapters = np.asarray(chapters, dtype=np.int32)
+        self.centroids = normalize(centroids)
+        self.speaker_chapters = speaker_chapters or {}
+
+    @classmethod
+    def from_embeddings(cls, verse_chapters: Sequence[np.ndarray], verse_embeddings: Sequence[np.ndarray],
+                        intro_chapters: Optional[np.ndarray] = None,
+                        intro_embeddings: Optional[np.ndarray] = None,
+                        intro_weight: float = 1.0,
+                        speaker_chapters: Optional[Dict[str, Set[int]]] = None) -> "ChapterRouter":
+        """
+        Builds the centroids from one or more embedding sources.
+
+        Args:
+            verse_chapters (Sequence[np.ndarray]): chapter_no of each row, per source
+            verse_embeddings (Sequence[np.ndarray]): (rows, dim) embeddings, per source
+            intro_chapters (np.ndarray, optional): chapter_no of each introduction
+            intro_embeddings (np.ndarray, optional): Embedding of each introduction
+            intro_weight (float): Weight of the introduction against the verse mean
+            speaker_chapters (Dict[str, Set[int]], optional): See the class
+        """
+        chapters = np.concatenate([np.asarray(c) for c in verse_chapters])
+        embeddings = normalize(np.vstack(verse_embeddings))
+        chapter_nos = np.unique(chapters)
+        centroids = normalize(np.vstack([embeddings[chapters == c].mean(axis=0) for c in chapter_nos]))
+
+        if intro_embeddings is not None:
+            intros = dict(zip(np.asarray(intro_chapters).tolist(), normalize(intro_embeddings)))
+            for i, chapter_no in enumerate(chapter_nos.tolist()):
+                if chapter_no in intros:
+                    centroids[i] = centroids[i] + intro_weight * intros[chapter_no]
+        return cls(chapter_nos, centroids, speaker_chapters)
+
+    def top_chapters(self, query_vector: np.ndarray, n: int,
+                     chapter_range: Optional[Tuple[int, int]] = None,
+                     speaker_name: Optional[str] = None) -> List[int]:
+        """
+        Returns the n chapters whose centroids are closest to the query, restricted to
+        chapter_range and to the chapters where speaker_name speaks when they are given.
+        """
+        similarities = self.centroids @ normalize(query_vector)
+        candidates = np.arange(len(self.chapters))
+        if chapter_range:
+            candidates = candidates[(self.chapters >= chapter_range[0]) & (self.chapters <= chapter_range[1])]
+        if speaker_name:
+            speaks = list(self.speaker_chapters.get(speaker_name.lower(), ()))
+            candidates = candidates[np.isin(self.chapters[candidates], speaks)]
+        best = candidates[np.argsort(-similarities[candidates], kind="stable")[:n]]
+        return self.chapters[best].tolist()
@@ -0,0 +1,74 @@
+"""
+Describes each searchable sacred text as a set of embedding sources plus the table
+holding its verse details, so the search code treats every text the same way and a
+new text only needs a new Corpus entry rather than a new endpoint.
+"""
+from typing import Dict, List, Optional
+from sqlalchemy import Table, select
+
+
+class EmbeddingSource:
+    """
+    A single embedding column that can be ranked against a query embedding.
+
+    Args:
+        name (str): Label reported as the match source (e.g. "question", "commentary")
+        table (Table): Table holding the embeddings, keyed by chapter_no and verse_no
+        embedding_column (str): Name of the pgvector column to rank
+    """
+
+    def __init__(self, name: str, table: Table, embedding_column: str):
+        self.name = name
+        self.table = table
+        self.embedding = table.c[embedding_column]
+
+    def rank_query(self, query_embedding, limit: int, clauses: Optional[list] = None):
+        """
+        Builds the query returning (chapter_no, verse_no, similarity) for the closest rows.
+        query_embedding is the SQL expression of the query vector, see
+        storage.query_vector_expression.
+        """
+        distance = self.embedding.op('<=>')(query_embedding)
+        return select(
+            self.table.c.chapter_no,
+            self.table.c.verse_no,
+            distance.label("similarity")
+        ).where(
+            *(clauses or [])
+        ).order_by(
+            distance
+        ).limit(limit)
+
+
+class Corpus:
+    """
+    A sacred text that can be searched.
+
+    Args:
+        name (str): Short identifier used in requests and responses (e.g. "gita")
+        title (str): Human readable title
+        sources (List[EmbeddingSource]): Embedding columns searched for this text
+        details_table (Table): Table the verse details are read from
+        detail_columns (Dict[str, str]): Response key -> column name in details_table
+        has_speaker (bool): Whether verses carry a speaker_name that can be filtered on
+    """
+
+    def __init__(self, name: str, title: str, sources: List[EmbeddingSource],
+                 details_table: Table, detail_columns: Dict[str, str], has_speaker: bool = False):
+        self.name = name
+        self.title = title
+        self.sources = sources
+        self.details_table = details_table
+        self.detail_columns = detail_columns
+        self.has_speaker = has_speaker
+
+    def details_query(self, chapter_no: int, verse_no: int):
+        """
+        Builds the query returning the detail columns of a single verse.
+        """
+        return select(
+            *(self.details_table.c[column].label(key) for key, column in self.detail_columns.items())
+        ).where(
+            (self.details_table.c.chapter_no == chapter_no) &
+            (self.details_table.c.verse_no == verse_no)
+        ).limit(1)
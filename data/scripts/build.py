@@ -0,0 +1,236 @@
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from dotenv import load_dotenv
+
+# Runs the data scripts as one incremental build. Each stage declares the files it reads
+# and writes; a stage depends on the stages writing its inputs, is skipped when the
+# fingerprint of its script, inputs and environment matches the last successful run,
+# and runs in parallel with the stages it does not depend on.
+# Run from the repository root: python data/scripts/build.py [stage ...] [--jobs 4]
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+STATE_FILE = "data/processed/.build_state.json"
+
+GITA_QUESTIONS = "data/Bhagwad_Gita_Verses_English_Questions.csv"
+PYS_QUESTIONS = "data/Patanjali_Yoga_Sutras_Verses_English_Questions.csv"
+
+
+class Stage:
+    """
+    Args:
+        name (str): Stage name, also accepted on the command line
+        script (str): Script run with the current Python from the repository root
+        inputs (list): Files the script reads, fingerprinted by content
+        outputs (list): Files the script writes; a stage writing to the database has none
+        env (list): Environment variables whose values are part of the fingerprint
+        manual (bool): Only re-run when an output is missing or the stage is forced, for
+            scrapes whose real input is a website
+    """
+
+    def __init__(self, name, script, inputs=(), outputs=(), env=(), manual=False):
+        self.name = name
+        self.script = script
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.env = list(env)
+        self.manual = manual
+
+
+STAGES = [
+    Stage("scrape_chapters", "data/scripts/scrape_chapters.py",
+          outputs=["data/scraped/chapters.csv"], manual=True),
+    Stage("modify_data", "data/scripts/modify_data.py",
+          inputs=[GITA_QUESTIONS], outputs=["data/processed/info.csv"]),
+    Stage("scrape_commentary", "data/scripts/scrape_commentary.py",
+          inputs=["data/processed/info.csv"], outputs=["data/processed/temp.csv"], manual=True),
+    Stage("embedding_creation", "data/scripts/embedding_creation.py",
+          inputs=["data/processed/temp.csv"], outputs=["data/processed/temp_with_embeddings.csv"]),
+    Stage("question_table", "data/scripts/question_table.py",
+          inputs=[GITA_QUESTIONS], outputs=["data/processed/questions.csv"]),
+    Stage("pys_embeddings", "data/scripts/pys_embeddings.py",
+          inputs=[PYS_QUESTIONS], outputs=["data/processed/pys_questions.csv"]),
+    Stage("seed_chapters", "data/scripts/seed_chapters.py",
+          inputs=["data/scraped/chapters.csv"], env=["DATABASE_URL"]),
+    Stage("seed_info", "data/scripts/seed_info.py",
+          inputs=["data/processed/temp_with_embeddings.csv"], env=["DATABASE_URL"]),
+    Stage("seed_questions", "data/scripts/seed_questions.py",
+          inputs=["data/processed/questions.csv"], env=["DATABASE_URL"]),
+    Stage("seed_pys", "data/scripts/seed_pys.py",
+          inputs=["data/processed/pys_questions.csv"], env=["DATABASE_URL"]),
+    Stage("build_bundle", "data/scripts/build_bundle.py",
+          inputs=["data/processed/temp.csv", GITA_QUESTIONS, "data/processed/pys_questions.csv",
+                  "data/scraped/chapters.csv", "schema.py"],
+          outputs=["data/processed/texts.sqlite"]),
+    Stage("calibrate_scope_gate", "data/scripts/calibrate_scope_gate.py",
+          inputs=["data/processed/texts.sqlite", "scope_gate.py"],
+          outputs=["data/processed/scope_gate.npz"]),
+]
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(os.path.join(ROOT, path), "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def fingerprint(stage):
+    """Hash of the stage's script, input contents and environment values"""
+    digest = hashlib.sha256()
+    for path in [stage.script] + stage.inputs:
+        digest.update(f"{path}:{file_digest(path)}\n".encode())
+    for name in stage.env:
+        digest.update(f"{name}={os.getenv(name, '')}\n".encode())
+    return digest.hexdigest()
+
+
+def dependencies(stages):
+    """Stage name -> names of the stages writing its inputs"""
+    producers = {output: stage.name for stage in stages for output in stage.outputs}
+    return {
+        stage.name: {producers[path] for path in stage.inputs if path in producers}
+        for stage in stages
+    }
+
+
+def select_stages(targets):
+    """The targets and every stage they depend on, in declaration order"""
+    if not targets:
+        return list(STAGES)
+    by_name = {stage.name: stage for stage in STAGES}
+    unknown = [name for name in targets if name not in by_name]
+    if unknown:
+        raise SystemExit(f"Unknown stages: {', '.join(unknown)}. Stages: {', '.join(by_name)}")
+    deps = dependencies(STAGES)
+    selected, pending = set(), list(targets)
+    while pending:
+        name = pending.pop()
+        if name not in selected:
+            selected.add(name)
+            pending.extend(deps[name])
+    return [stage for stage in STAGES if stage.name in selected]
+
+
+class Build:
+    def __init__(self, stages, force, dry_run):
+        self.stages = stages
+        self.force = set(force)
+        self.dry_run = dry_run
+        self.state_path = os.path.join(ROOT, STATE_FILE)
+        self.state = {}
+        if os.path.exists(self.state_path):
+            with open(self.state_path) as f:
+                self.state = json.load(f)
+        self.state_lock = threading.Lock()
+        # Stage name -> (status, seconds)
+        self.results = {}
+
+    def up_to_date(self, stage, stage_fingerprint):
+        if stage.name in self.force:
+            return False
+        outputs_exist = all(os.path.exists(os.path.join(ROOT, path)) for path in stage.outputs)
+        if stage.manual:
+            return outputs_exist
+        return outputs_exist and self.state.get(stage.name) == stage_fingerprint
+
+    def run_stage(self, stage):
+        start = time.perf_counter()
+        # Manual stages only look at their outputs, so a dry run can decide them like a real one
+        if stage.manual and self.up_to_date(stage, None):
+            return "skipped", time.perf_counter() - start, "manual, outputs present"
+        # In a dry run, inputs of a stage whose dependencies would run are not written yet
+        upstream_runs = any(self.results[dep][0] == "would run" for dep in self.deps[stage.name])
+        if upstream_runs:
+            return "would run", 0.0, "a dependency would run"
+        missing = [path for path in [stage.script] + stage.inputs if not os.path.exists(os.path.join(ROOT, path))]
+        if missing:
+            return "failed", 0.0, f"missing inputs: {', '.join(missing)}"
+
+        stage_fingerprint = fingerprint(stage)
+        if self.up_to_date(stage, stage_fingerprint):
+            return "skipped", time.perf_counter() - start, "unchanged"
+        if self.dry_run:
+            return "would run", 0.0, ""
+
+        for path in stage.outputs:
+            os.makedirs(os.path.dirname(os.path.join(ROOT, path)), exist_ok=True)
+        process = subprocess.run([sys.executable, stage.script], cwd=ROOT, capture_output=True, text=True)
+        elapsed = time.perf_counter() - start
+        if process.returncode != 0:
+            tail = "\n".join((process.stdout + process.stderr).strip().splitlines()[-20:])
+            return "failed", elapsed, tail
+
+        with self.state_lock:
+            self.state[stage.name] = stage_fingerprint
+            os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+            with open(self.state_path, "w") as f:
+                json.dump(self.state, f, indent=2, sort_keys=True)
+        return "ran", elapsed, ""
+
+    def run(self, jobs):
+        names = {stage.name for stage in self.stages}
+        deps = self.deps = {name: stage_deps & names for name, stage_deps in dependencies(self.stages).items()}
+        pending = list(self.stages)
+        running = {}
+        start = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            while pending or running:
+                for stage in list(pending):
+                    statuses = [self.results.get(dep, (None,))[0] for dep in deps[stage.name]]
+                    if any(status in ("failed", "blocked") for status in statuses):
+                        pending.remove(stage)
+                        self.results[stage.name] = ("blocked", 0.0)
+                        print(f"[blocked] {stage.name}: a dependency failed")
+                    elif all(status is not None for status in statuses):
+                        pending.remove(stage)
+                        running[executor.submit(self.run_stage, stage)] = stage
+                        print(f"[start]   {stage.name}")
+                if not running:
+                    continue
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage = running.pop(future)
+                    try:
+                        status, elapsed, detail = future.result()
+                    except Exception as e:
+                        status, elapsed, detail = "failed", 0.0, str(e)
+                    self.results[stage.name] = (status, elapsed)
+                    print(f"[{status}] {stage.name} in {elapsed:.1f}s" + (f": {detail}" if detail else ""))
+
+        total = time.perf_counter() - start
+        print(f"\n{'stage':<24}{'status':<12}{'seconds':>9}")
+        for stage in self.stages:
+            status, elapsed = self.results[stage.name]
+            print(f"{stage.name:<24}{status:<12}{elapsed:>9.1f}")
+        print(f"{'total (wall)':<36}{total:>9.1f}")
+        return all(status not in ("failed", "blocked") for status, _ in self.results.values())
+
+
+if __name__ == "__main__":
+    # Seeds read DATABASE_URL from .env, so its value is fingerprinted from there too
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Incremental build of the processed data, database and bundle")
+    parser.add_argument("stages", nargs="*", help="Stages to build with their dependencies (default: all)")
+    parser.add_argument("--jobs", type=int, default=4, help="Stages run in parallel")
+    parser.add_argument("--force", nargs="+", default=[], metavar="STAGE", help="Re-run these stages")
+    parser.add_argument("--dry-run", action="store_true", help="Only report which stages would run")
+    parser.add_argument("--list", action="store_true", help="List the stages and their dependencies")
+    args = parser.parse_args()
+
+    if args.list:
+        for name, deps in dependencies(STAGES).items():
+            print(f"{name:<24}<- {', '.join(sorted(deps)) or '-'}")
+        sys.exit(0)
+    ok = Build(select_stages(args.stages), args.force, args.dry_run).run(args.jobs)
+    sys.exit(0 if ok else 1)
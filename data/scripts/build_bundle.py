@@ -0,0 +1,111 @@
+import argparse
+import ast
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+from sentence_transformers import SentenceTransformer
+from sqlalchemy import create_engine, insert
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from schema import metadata, info_table, questions_table, chapter_table, pys_question_table
+
+# Builds the single-file SQLite bundle read by the embedded storage backend
+# (STORAGE_BACKEND=embedded). Same tables and columns as Postgres, with every embedding
+# stored as a float32 blob instead of a pgvector.
+# Run from the repository root: python data/scripts/build_bundle.py
+
+model = SentenceTransformer('all-MiniLM-L6-v2')
+
+def to_blob(embedding):
+    return np.asarray(embedding, dtype=np.float32).tobytes()
+
+def encode(texts):
+    return model.encode([text if isinstance(text, str) else "" for text in texts], show_progress_bar=True)
+
+def nullable(value):
+    return None if pd.isna(value) else value
+
+def info_rows():
+    df = pd.read_csv("data/processed/temp.csv")
+    print("Generating embeddings for translations and commentaries...")
+    translation_embeddings = encode(df["translation"].tolist())
+    commentary_embeddings = encode(df["commentary"].tolist())
+    return [
+        {
+            "chapter_no": int(row.chapter),
+            "verse_no": int(row.verse),
+            "sanskrit_verse": nullable(row.sanskrit),
+            "speaker_name": nullable(row.speaker),
+            "english_translations": nullable(row.translation),
+            "commentary": nullable(row.commentary),
+            "translation_embedding": to_blob(translation),
+            "commentary_embedding": to_blob(commentary)
+        }
+        for row, translation, commentary in zip(df.itertuples(), translation_embeddings, commentary_embeddings)
+    ]
+
+def question_rows():
+    df = pd.read_csv("data/Bhagwad_Gita_Verses_English_Questions.csv").dropna(subset=["question"])
+    print("Generating embeddings for questions...")
+    embeddings = encode(df["question"].tolist())
+    return [
+        {
+            "question_id": question_id,
+            "chapter_no": int(row.chapter),
+            "verse_no": int(row.verse),
+            "possible_question": row.question,
+            "question_embedding": to_blob(embedding)
+        }
+        for question_id, (row, embedding) in enumerate(zip(df.itertuples(), embeddings), 1)
+    ]
+
+def pys_question_rows():
+    # pys_questions.csv already carries the question embeddings
+    df = pd.read_csv("data/processed/pys_questions.csv")
+    return [
+        {
+            "question_id": question_id,
+            "chapter_no": int(row.chapter_no),
+            "verse_no": int(row.verse_no),
+            "sanskrit": nullable(row.sanskrit),
+            "translation": nullable(row.translation),
+            "possible_question": nullable(row.possible_question),
+            "question_embedding": to_blob(ast.literal_eval(row.question_embedding))
+        }
+        for question_id, row in enumerate(df.itertuples(), 1)
+    ]
+
+def chapter_rows():
+    df = pd.read_csv("data/scraped/chapters.csv")
+    return [
+        {
+            "chapter_no": int(row.chapter_no),
+            "chapter_heading": row.chapter_title,
+            "chapter_desc_heading": row.chapter_desc_heading,
+            "chapter_intro": row.chapter_intro
+        }
+        for row in df.itertuples()
+    ]
+
+def main(output):
+    if os.path.exists(output):
+        os.remove(output)
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+
+    engine = create_engine(f"sqlite:///{output}")
+    metadata.create_all(engine)
+    with engine.begin() as connection:
+        for table, rows in ((info_table, info_rows()), (questions_table, question_rows()),
+                            (pys_question_table, pys_question_rows()), (chapter_table, chapter_rows())):
+            connection.execute(insert(table), rows)
+            print(f"{table.name}: {len(rows)} rows")
+    print(f"Bundle written to {output}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the SQLite bundle of the embedded storage backend")
+    parser.add_argument("--output", default="data/processed/texts.sqlite")
+    args = parser.parse_args()
+    main(args.output)
@@ -0,0 +1,94 @@
+import argparse
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from schema import CORPORA
+from scope_gate import ScopeGate, kmeans_prototypes, normalize
+from storage import EmbeddedStorage
+
+# Fits the scope gate read by app.py (SCOPE_GATE_PATH): k-means prototypes of every
+# embedding the full search ranks for a corpus (Gita questions, translations and
+# commentaries, Yoga Sutras questions), read from the embedded bundle, and a threshold
+# per corpus set so that the given quantile of those rows stays in scope, plus a margin.
+# Before fitting, a k-fold split of each corpus's questions reports, per quantile, how
+# many held-out questions the gate would reject and how many of those the full path
+# would have answered.
+# Needs the bundle built by data/scripts/build_bundle.py.
+# Run from the repository root: python data/scripts/calibrate_scope_gate.py
+
+REPORT_QUANTILES = [0.95, 0.98, 0.99, 0.995, 1.0]
+
+def load_embeddings(bundle):
+    """Corpus name -> (question embeddings, embeddings of its other sources)"""
+    storage = EmbeddedStorage(bundle)
+    embeddings = {}
+    for name, corpus in CORPORA.items():
+        questions, others = [], []
+        for source in corpus.sources:
+            vectors = storage.source_embeddings(source)[1]
+            # Empty texts have zero embeddings, which no query can be close to
+            vectors = normalize(vectors[np.linalg.norm(vectors, axis=1) > 0])
+            (questions if source.name == "question" else others).append(vectors)
+        embeddings[name] = (np.vstack(questions), np.vstack(others) if others else questions[0][:0])
+        print(f"{name}: {len(embeddings[name][0])} questions, {len(embeddings[name][1])} other embeddings")
+    return embeddings
+
+def nearest_distances(vectors, prototypes):
+    return 1.0 - np.max(vectors @ prototypes.T, axis=1)
+
+def cross_validate(questions, others, folds, k, margin, answer_threshold):
+    """
+    Held-out questions rejected and, among them, the ones the full path would have
+    answered (a training row within answer_threshold), per REPORT_QUANTILES.
+    """
+    order = np.random.default_rng(0).permutation(len(questions))
+    rejected = np.zeros(len(REPORT_QUANTILES), dtype=int)
+    answerable = np.zeros(len(REPORT_QUANTILES), dtype=int)
+    for fold in np.array_split(order, folds):
+        held_out = questions[fold]
+        training = np.vstack([np.delete(questions, fold, axis=0), others])
+        prototypes = kmeans_prototypes(training, k)
+        training_distances = nearest_distances(training, prototypes)
+        held_out_distances = nearest_distances(held_out, prototypes)
+        answered = 1.0 - np.max(held_out @ training.T, axis=1) <= answer_threshold
+        for i, quantile in enumerate(REPORT_QUANTILES):
+            rejects = held_out_distances > np.quantile(training_distances, quantile) + margin
+            rejected[i] += rejects.sum()
+            answerable[i] += (rejects & answered).sum()
+    return rejected, answerable
+
+def main(bundle, output, k, quantile, margin, folds, answer_threshold):
+    embeddings = load_embeddings(bundle)
+
+    print(f"\nHeld-out questions rejected over {folds} folds (margin {margin}), "
+          f"and those the full path would have answered:")
+    for name, (questions, others) in embeddings.items():
+        rejected, answerable = cross_validate(questions, others, folds, k, margin, answer_threshold)
+        for q, r, a in zip(REPORT_QUANTILES, rejected, answerable):
+            marker = "  <-" if q == quantile else ""
+            print(f"  {name:<6}{q:<7}rejected {r}/{len(questions)}, answerable {a}{marker}")
+
+    gate = ScopeGate.fit({name: np.vstack(pair) for name, pair in embeddings.items()}, k, quantile, margin)
+    gate.save(output)
+    print(f"\nThresholds " + ", ".join(f"{n} {t:.3f}" for n, t in gate.thresholds.items()))
+    print(f"Scope gate written to {output}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fit the out-of-scope query gate")
+    parser.add_argument("--bundle", default="data/processed/texts.sqlite")
+    parser.add_argument("--output", default="data/processed/scope_gate.npz")
+    parser.add_argument("--k", type=int, default=32, help="Prototypes per corpus")
+    # The gate should only reject clearly off-topic queries: lower the quantile only when
+    # the report shows no answerable held-out question rejected at the new value
+    parser.add_argument("--quantile", type=float, default=1.0,
+                        help="Share of each corpus's ranked embeddings that must stay in scope")
+    parser.add_argument("--margin", type=float, default=0.05, help="Added to the quantile distance")
+    parser.add_argument("--folds", type=int, default=5, help="Folds of the held-out report")
+    parser.add_argument("--answer-threshold", type=float, default=0.5,
+                        help="Distance under which the full path answers (SIMILARITY_THRESHOLD in app.py)")
+    args = parser.parse_args()
+    main(args.bundle, args.output, args.k, args.quantile, args.margin, args.folds, args.answer_threshold)
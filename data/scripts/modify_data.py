@@ -2,7 +2,7 @@ import pandas as pd
 import os
 
 # Load CSV data into pandas DataFrame
-df = pd.read_csv("data\\Bhagwad_Gita_Verses_English_Questions.csv")
+df = pd.read_csv("data/Bhagwad_Gita_Verses_English_Questions.csv")
 
 # Mapping Sanskrit to English speakers
 sanskrit_to_english = {
@@ -0,0 +1,168 @@
+import argparse
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from dotenv import load_dotenv
+from mistralai import Mistral
+from sqlalchemy import create_engine, select, func
+from sqlalchemy.dialects import postgresql, sqlite
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from prompt_builder import PRECOMPUTED_PROMPT_VERSION, build_precomputed_prompt
+from schema import info_table, metadata, pys_question_table, verse_summary_table
+
+# Load environment variables
+load_dotenv()
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+MISTRAL_API_KEY = os.getenv("MISTRAL_API_KEY")
+# Summaries go where the app reads them: "postgres" writes to DATABASE_URL, "embedded"
+# to the SQLite bundle at EMBEDDED_BUNDLE
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "postgres")
+EMBEDDED_BUNDLE = os.getenv("EMBEDDED_BUNDLE", "data/processed/texts.sqlite")
+if not MISTRAL_API_KEY:
+    raise ValueError("MISTRAL_API_KEY not set in .env file")
+if STORAGE_BACKEND == "postgres":
+    if not DATABASE_URL:
+        raise ValueError("DATABASE_URL not set in .env file")
+    if DATABASE_URL.startswith("postgres://"):
+        DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
+    engine = create_engine(DATABASE_URL)
+elif STORAGE_BACKEND == "embedded":
+    if not os.path.exists(EMBEDDED_BUNDLE):
+        raise ValueError(f"No bundle at {EMBEDDED_BUNDLE}; run data/scripts/build_bundle.py first")
+    engine = create_engine(f"sqlite:///{EMBEDDED_BUNDLE}")
+else:
+    raise ValueError(f"Unknown STORAGE_BACKEND '{STORAGE_BACKEND}', expected 'postgres' or 'embedded'")
+
+# Both dialects spell the upsert as INSERT ... ON CONFLICT DO UPDATE
+insert = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}[engine.dialect.name]
+
+# MISTRAL_SERVER_URL points the job at another server, e.g. testing/fake_mistral.py
+mistral_client = Mistral(api_key=MISTRAL_API_KEY, server_url=os.getenv("MISTRAL_SERVER_URL"))
+MISTRAL_MODEL = "mistral-large-latest"
+
+def pending_verses(connection):
+    """
+    Lists the verses without a summary for the current PRECOMPUTED_PROMPT_VERSION,
+    so an interrupted run resumes where it stopped.
+    """
+    done = select(
+        verse_summary_table.c.corpus,
+        verse_summary_table.c.chapter_no,
+        verse_summary_table.c.verse_no
+    ).where(verse_summary_table.c.prompt_version == PRECOMPUTED_PROMPT_VERSION)
+    done = {tuple(row) for row in connection.execute(done)}
+
+    verses = []
+    gita_rows = connection.execute(select(
+        info_table.c.chapter_no,
+        info_table.c.verse_no,
+        info_table.c.english_translations,
+        info_table.c.commentary
+    ).order_by(info_table.c.chapter_no, info_table.c.verse_no))
+    for row in gita_rows:
+        verses.append({
+            "corpus": "gita", "title": "Bhagavad Gita", "chapter_no": row[0], "verse_no": row[1],
+            "translation": row[2] or "", "commentary": row[3] or ""
+        })
+
+    # pys_question holds one row per question; any of them carries the sutra's translation
+    first_question = select(func.min(pys_question_table.c.question_id)).group_by(
+        pys_question_table.c.chapter_no, pys_question_table.c.verse_no
+    )
+    pys_rows = connection.execute(select(
+        pys_question_table.c.chapter_no,
+        pys_question_table.c.verse_no,
+        pys_question_table.c.translation
+    ).where(
+        pys_question_table.c.question_id.in_(first_question)
+    ).order_by(pys_question_table.c.chapter_no, pys_question_table.c.verse_no))
+    for row in pys_rows:
+        verses.append({
+            "corpus": "pys", "title": "Patanjali Yoga Sutras", "chapter_no": row[0], "verse_no": row[1],
+            "translation": row[2] or "", "commentary": ""
+        })
+
+    return [v for v in verses if (v["corpus"], v["chapter_no"], v["verse_no"]) not in done]
+
+def generate_with_retries(prompt, retries=4, timeout_ms=60000):
+    """
+    Calls Mistral, retrying failures with exponential backoff and jitter.
+    """
+    for attempt in range(retries + 1):
+        try:
+            response = mistral_client.chat.complete(
+                model=MISTRAL_MODEL,
+                messages=[{"role": "user", "content": prompt}],
+                timeout_ms=timeout_ms
+            )
+            return response.choices[0].message.content.strip()
+        except Exception as e:
+            if attempt == retries:
+                raise
+            delay = min(60, 2 ** attempt) * random.uniform(0.5, 1.5)
+            print(f"Attempt {attempt + 1} failed ({e}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+def summarize_and_store(verse, retries):
+    """
+    Generates the summary of one verse and upserts it straight away.
+    """
+    prompt = build_precomputed_prompt(verse["title"], verse["translation"], verse["commentary"])
+    summary = generate_with_retries(prompt, retries=retries)
+    stmt = insert(verse_summary_table).values(
+        corpus=verse["corpus"],
+        chapter_no=verse["chapter_no"],
+        verse_no=verse["verse_no"],
+        summary=summary,
+        prompt_version=PRECOMPUTED_PROMPT_VERSION,
+        model=MISTRAL_MODEL
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["corpus", "chapter_no", "verse_no"],
+        set_={"summary": stmt.excluded.summary,
+              "prompt_version": stmt.excluded.prompt_version,
+              "model": stmt.excluded.model}
+    )
+    with engine.begin() as connection:
+        connection.execute(stmt)
+
+def main(concurrency, retries, limit=None):
+    metadata.create_all(engine, tables=[verse_summary_table])
+    with engine.connect() as connection:
+        verses = pending_verses(connection)
+    if limit:
+        verses = verses[:limit]
+    print(f"{len(verses)} verses to summarize with prompt {PRECOMPUTED_PROMPT_VERSION}")
+
+    start = time.perf_counter()
+    failed = 0
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {executor.submit(summarize_and_store, verse, retries): verse for verse in verses}
+        for done, future in enumerate(as_completed(futures), 1):
+            verse = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                failed += 1
+                print(f"Giving up on {verse['corpus']} {verse['chapter_no']}.{verse['verse_no']}: {e}")
+            if done % 25 == 0 or done == len(verses):
+                print(f"{done}/{len(verses)} done in {time.perf_counter() - start:.0f}s, {failed} failed")
+
+    if failed:
+        print(f"{failed} verses failed; run the script again to retry them.")
+    else:
+        print("All summaries precomputed.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute a query-independent summary for every verse")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent Mistral calls")
+    parser.add_argument("--retries", type=int, default=4, help="Retries per verse before giving up")
+    parser.add_argument("--limit", type=int, default=None, help="Only summarize this many verses")
+    args = parser.parse_args()
+    main(args.concurrency, args.retries, args.limit)
@@ -6,7 +6,7 @@ model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
 
 # Input and output file paths
 input_file = 'data/Patanjali_Yoga_Sutras_Verses_English_Questions.csv'
-output_file = 'data/processed/patanjali_questions.csv'
+output_file = 'data/processed/pys_questions.csv'
 
 # Load the input CSV
 print("Loading input file...")
@@ -20,6 +20,9 @@ if 'question' not in questions_df.columns:
 print("Generating question embeddings...")
 questions_df['question_embedding'] = questions_df['question'].apply(lambda x: model.encode(x).tolist())
 
+# Rename columns to match the pys_question table read by seed_pys.py
+questions_df.rename(columns={'chapter': 'chapter_no', 'verse': 'verse_no', 'question': 'possible_question'}, inplace=True)
+
 # Save the updated DataFrame to a new CSV file
 print(f"Saving processed data to {output_file}...")
 questions_df.to_csv(output_file, index=False)
@@ -108,8 +108,8 @@ def process_verses():
         df.to_csv("data/processed/info_temp.csv", index=False)
         print(f"Progress saved after chapter {chapter_no}.")
     
-    # Save final CSV
-    df.to_csv("data/processed/info.csv", index=False)
+    # Save final CSV, read by embedding_creation.py and build_bundle.py
+    df.to_csv("data/processed/temp.csv", index=False)
     print("Verse data scraped and saved to CSV.")
 
 # Run the script
@@ -5,12 +5,14 @@ import os
 
 load_dotenv()
 
-# Database connection
-DATABASE_URI = os.getenv("DATABASE_URI")
-if not DATABASE_URI:
-    raise ValueError("DATABASE_URI not set in .env file")
+# Database connection, same variable as app.py
+DATABASE_URL = os.getenv("DATABASE_URL")
+if not DATABASE_URL:
+    raise ValueError("DATABASE_URL not set in .env file")
+if DATABASE_URL.startswith("postgres://"):
+    DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
-engine = create_engine(DATABASE_URI)
+engine = create_engine(DATABASE_URL)
 metadata = MetaData()
 
 # Define the chapter table
@@ -38,6 +40,8 @@ with engine.connect() as connection:
     # Begin a new transaction
     trans = connection.begin()
     try:
+        # Replace earlier rows so the seed can be re-run
+        connection.execute(chapter_table.delete())
         for index, row in df.iterrows():
             # Print the row being processed
             print(f"Processing row {index}: {row.to_dict()}")
@@ -59,4 +63,5 @@ with engine.connect() as connection:
     except Exception as e:
         # Rollback the transaction in case of error
         trans.rollback()
-        print(f"Error occurred: {e}")
\ No newline at end of file
+        print(f"Error occurred: {e}")
+        raise
\ No newline at end of file
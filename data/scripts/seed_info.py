@@ -8,12 +8,14 @@ import ast
 # Load environment variables
 load_dotenv()
 
-# Database connection
-DATABASE_URI = os.getenv("DATABASE_URI")
-if not DATABASE_URI:
-    raise ValueError("DATABASE_URI not set in .env file")
+# Database connection, same variable as app.py
+DATABASE_URL = os.getenv("DATABASE_URL")
+if not DATABASE_URL:
+    raise ValueError("DATABASE_URL not set in .env file")
+if DATABASE_URL.startswith("postgres://"):
+    DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
-engine = create_engine(DATABASE_URI)
+engine = create_engine(DATABASE_URL)
 metadata = MetaData()
 
 # Define the info table
@@ -58,10 +60,12 @@ df.rename(
     inplace=True
 )
 
-# Insert data into the database
+# Insert data into the database, replacing earlier rows so the seed can be re-run
 try:
     with engine.begin() as connection:
+        connection.execute(info_table.delete())
         df.to_sql("info", connection, if_exists="append", index=False, method="multi")
     print("Data ingestion completed successfully.")
 except Exception as e:
     print(f"Error during data ingestion: {e}")
+    raise
@@ -9,6 +9,8 @@ load_dotenv()
 
 # Database connection
 DATABASE_URL = os.getenv("DATABASE_URL")
+if not DATABASE_URL:
+    raise ValueError("DATABASE_URL not set in .env file")
 if DATABASE_URL.startswith("postgres://"):
     DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
 engine = create_engine(DATABASE_URL)
@@ -47,9 +49,12 @@ questions_df['question_embedding'] = questions_df['question_embedding'].apply(la
 
 # Insert data into the PostgreSQL table
 try:
-    with engine.connect() as connection:
+    with engine.begin() as connection:
+        # Replace earlier rows so the seed can be re-run
+        connection.execute(pys_question.delete())
         # Use pandas' to_sql for bulk insertion
         questions_df.to_sql('pys_question', con=connection, if_exists='append', index=False)
     print("Data insertion complete!")
 except Exception as e:
-    print(f"An error occurred during data insertion: {e}")
\ No newline at end of file
+    print(f"An error occurred during data insertion: {e}")
+    raise
\ No newline at end of file
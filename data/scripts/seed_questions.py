@@ -7,12 +7,14 @@ import ast
 
 # Load environment variables
 load_dotenv()
-DATABASE_URI = os.getenv("DATABASE_URI")
-if not DATABASE_URI:
-    raise ValueError("DATABASE_URI not set in .env file")
+DATABASE_URL = os.getenv("DATABASE_URL")
+if not DATABASE_URL:
+    raise ValueError("DATABASE_URL not set in .env file")
+if DATABASE_URL.startswith("postgres://"):
+    DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
 # Connect to the database
-engine = create_engine(DATABASE_URI)
+engine = create_engine(DATABASE_URL)
 metadata = MetaData()
 
 # Define the questions table
@@ -36,6 +38,8 @@ def load_csv(file_path):
 def seed_questions_table(csv_file):
     df = load_csv(csv_file)
     with engine.begin() as connection:
+        # Replace earlier rows so the seed can be re-run
+        connection.execute(questions_table.delete())
         for _, row in df.iterrows():
             stmt = insert(questions_table).values(
                 chapter_no=row['chapter_no'],
@@ -0,0 +1,83 @@
+"""
+Builds a short summary of a verse without the LLM by picking the sentences of its
+translation and commentary that are closest to the user's question. It runs after the
+summary budget is spent, so only a few sentences, preselected by the words they share
+with the question, are encoded.
+"""
+import re
+from typing import Callable, List, Set
+
+import numpy as np
+
+# Sentence ends followed by whitespace and something that can start a sentence
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?"”])\s+(?=["“‘(\[A-Z0-9])')
+
+WORD = re.compile(r"[a-z0-9]+")
+# Question words and fillers that say nothing about a sentence's topic
+STOPWORDS = {"and", "are", "can", "does", "for", "from", "how", "into", "not", "one", "should",
+             "that", "the", "this", "what", "when", "where", "which", "who", "why", "with", "you", "your"}
+
+
+def split_sentences(text: str) -> List[str]:
+    """
+    Splits prose into sentences on terminal punctuation.
+    """
+    if not text:
+        return []
+    return [sentence.strip() for sentence in SENTENCE_BOUNDARY.split(text.strip()) if sentence.strip()]
+
+
+def rank_by_similarity(query_embedding: np.ndarray, embeddings: np.ndarray) -> np.ndarray:
+    """
+    Returns the row indices of embeddings ordered from most to least similar to the query.
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    query = np.asarray(query_embedding, dtype=np.float32)
+    scores = embeddings @ query / (np.linalg.norm(embeddings, axis=1) * np.linalg.norm(query) + 1e-12)
+    return np.argsort(-scores)
+
+
+def words(text: str) -> Set[str]:
+    """Lower-cased words of at least three characters, without stopwords"""
+    return {word for word in WORD.findall(text.lower()) if len(word) >= 3 and word not in STOPWORDS}
+
+
+def lexical_preselect(query: str, sentences: List[str], count: int) -> List[int]:
+    """
+    Indices of the count sentences sharing the most words with the query, in reading
+    order. Ties keep the earlier sentence, so the translation comes first.
+    """
+    query_words = words(query)
+    scores = [len(query_words & words(sentence)) for sentence in sentences]
+    return sorted(sorted(range(len(sentences)), key=lambda i: -scores[i])[:count])
+
+
+def extractive_summary(query: str, query_embedding: np.ndarray, translation: str, commentary: str,
+                       encode: Callable[[List[str]], np.ndarray],
+                       max_sentences: int = 4, max_encoded: int = 8) -> str:
+    """
+    Picks the sentences most similar to the query and returns them in reading order.
+
+    Args:
+        query (str): The user's question
+        query_embedding (np.ndarray): The query embedding already computed for the search
+        translation (str): English translation of the verse
+        commentary (str): Commentary on the verse
+        encode (Callable): Encodes a list of sentences, e.g. SentenceTransformer.encode
+        max_sentences (int): Number of sentences in the summary
+        max_encoded (int): Sentences encoded and ranked by similarity, out of those sharing
+            the most words with the query, to bound encoding time
+
+    Returns:
+        str: The summary, or the translation when there is nothing to rank
+    """
+    candidates = [
+        sentence for sentence in split_sentences(translation) + split_sentences(commentary)
+        if len(sentence.split()) >= 4
+    ]
+    if len(candidates) <= max_sentences:
+        return " ".join(candidates) or translation
+
+    candidates = [candidates[i] for i in lexical_preselect(query, candidates, max_encoded)]
+    chosen = sorted(rank_by_similarity(query_embedding, encode(candidates))[:max_sentences])
+    return " ".join(candidates[i] for i in chosen)
@@ -0,0 +1,275 @@
+"""
+Bounds how many LLM generations run at once, coalesces identical concurrent requests,
+sheds load when too many requests are already waiting and stops calling the LLM for a
+while after repeated failures.
+"""
+import re
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Hashable, Optional
+
+
+class LLMUnavailable(Exception):
+    """Base class for requests the gateway did not get a generation for"""
+
+
+class GatewayOverloaded(LLMUnavailable):
+    """Raised when a request is shed because the queue is full or it waited too long for a slot"""
+
+
+class DeadlineExceeded(LLMUnavailable):
+    """Raised when a request's latency budget ran out before a generation was available"""
+
+
+class CircuitOpen(LLMUnavailable):
+    """Raised when the circuit breaker is open and the LLM is not being called"""
+
+
+def call_timeout_ms(deadline: Optional[float], min_timeout_ms: int) -> Optional[int]:
+    """
+    Timeout of an LLM call that has to finish by deadline, computed right before the call.
+    Raises DeadlineExceeded instead of cutting the timeout below min_timeout_ms: a call
+    clipped that short by time spent queued would time out against a healthy upstream
+    and count as a failure in the circuit breaker.
+    """
+    if deadline is None:
+        return None
+    remaining_ms = int((deadline - time.monotonic()) * 1000)
+    if remaining_ms < min_timeout_ms:
+        raise DeadlineExceeded(f"{max(0, remaining_ms)}ms of the latency budget left, "
+                               f"less than the {min_timeout_ms}ms an LLM call needs")
+    return remaining_ms
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failures. While open every call is
+    rejected; after reset_timeout seconds a single trial call is let through, which
+    closes the breaker on success and re-opens it on failure.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return "half_open"
+            return "open"
+
+    def allow(self) -> bool:
+        """Whether a call may go ahead now"""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._trial_running:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_skipped(self):
+        """The allowed call never reached the LLM, e.g. because it was shed"""
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_running or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial_running = False
+
+
+class _Call:
+    """A generation in progress that identical requests can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalizes a user query for coalescing: case, surrounding punctuation and repeated
+    whitespace do not change the answer.
+    """
+    return re.sub(r"\s+", " ", query.lower()).strip(" ?!.,")
+
+
+class LLMGateway:
+    """
+    Runs LLM calls through a fixed number of slots.
+
+    Args:
+        max_in_flight (int): Maximum number of calls running at the same time
+        max_queue (int): Maximum number of calls waiting for a slot; further calls are shed
+        queue_timeout (float): Seconds a call may wait for a slot before it is shed
+        breaker (CircuitBreaker, optional): Rejects calls while the LLM keeps failing
+    """
+
+    def __init__(self, max_in_flight: int = 4, max_queue: int = 16, queue_timeout: float = 5.0,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.breaker = breaker or CircuitBreaker()
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._queued = 0
+        self._in_flight = 0
+        self._wait_times = deque(maxlen=1000)
+        self._counters = {
+            "requests": 0, "coalesced": 0, "completed": 0, "failed": 0,
+            "shed": 0, "deadline_exceeded": 0, "circuit_open": 0
+        }
+
+    def run(self, key: Hashable, generate: Callable[[], str], deadline: Optional[float] = None) -> str:
+        """
+        Runs generate() in a slot, or waits for the identical call already running.
+
+        Args:
+            key (Hashable): Identifies identical requests, e.g. (chapter_no, verse_no, normalized query)
+            generate (Callable[[], str]): The LLM call. It should enforce the deadline itself,
+                e.g. through the client's request timeout
+            deadline (float, optional): time.monotonic() value after which the caller stops waiting
+
+        Returns:
+            str: The generated text
+
+        Raises:
+            LLMUnavailable: If the request was shed, ran out of time or the breaker is open.
+                Errors raised by generate() are re-raised as they are
+        """
+        with self._lock:
+            self._counters["requests"] += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self._counters["coalesced"] += 1
+
+        if not leader:
+            if not call.done.wait(self._remaining(deadline)):
+                self._count("deadline_exceeded")
+                raise DeadlineExceeded("Timed out waiting for an identical request")
+            if call.error:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._run_in_slot(generate, deadline)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    @staticmethod
+    def _remaining(deadline: Optional[float]) -> Optional[float]:
+        return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+    def _count(self, counter: str):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def _run_in_slot(self, generate: Callable[[], str], deadline: Optional[float]) -> str:
+        if not self.breaker.allow():
+            self._count("circuit_open")
+            raise CircuitOpen("LLM circuit breaker is open")
+
+        try:
+            result = self._queue_and_generate(generate, deadline)
+        except LLMUnavailable:
+            self.breaker.record_skipped()
+            raise
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        return result
+
+    def _queue_and_generate(self, generate: Callable[[], str], deadline: Optional[float]) -> str:
+        with self._lock:
+            if self._queued >= self.max_queue:
+                self._counters["shed"] += 1
+                raise GatewayOverloaded("LLM queue is full")
+            self._queued += 1
+
+        start = time.monotonic()
+        remaining = self._remaining(deadline)
+        timeout = self.queue_timeout if remaining is None else min(self.queue_timeout, remaining)
+        acquired = self._slots.acquire(timeout=timeout)
+        with self._lock:
+            self._queued -= 1
+            self._wait_times.append(time.monotonic() - start)
+            if not acquired:
+                self._counters["shed"] += 1
+                raise GatewayOverloaded("Timed out waiting for an LLM slot")
+            if deadline is not None and time.monotonic() >= deadline:
+                self._counters["deadline_exceeded"] += 1
+                self._slots.release()
+                raise DeadlineExceeded("Latency budget spent while queued")
+            self._in_flight += 1
+
+        try:
+            result = generate()
+            with self._lock:
+                self._counters["completed"] += 1
+            return result
+        except DeadlineExceeded:
+            # Raised by call_timeout_ms before the LLM was called
+            with self._lock:
+                self._counters["deadline_exceeded"] += 1
+            raise
+        except Exception:
+            with self._lock:
+                self._counters["failed"] += 1
+            raise
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            self._slots.release()
+
+    def stats(self) -> Dict:
+        """
+        Returns the current queue depth, in-flight count, counters and queue wait times
+        (in milliseconds, over the last 1000 requests that queued).
+        """
+        with self._lock:
+            waits = sorted(self._wait_times)
+            stats = {
+                "max_in_flight": self.max_in_flight,
+                "max_queue": self.max_queue,
+                "in_flight": self._in_flight,
+                "queue_depth": self._queued,
+                "breaker_state": self.breaker.state,
+                **self._counters
+            }
+        if waits:
+            stats.update({
+                "wait_ms_p50": round(waits[len(waits) // 2] * 1000, 2),
+                "wait_ms_p95": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))] * 1000, 2),
+                "wait_ms_max": round(waits[-1] * 1000, 2),
+            })
+        return stats
@@ -0,0 +1,194 @@
+"""
+Opt-in profiling of single search requests. A profiled request records a cProfile trace,
+the time spent in each named stage (encode, search, summary, serialize, ...) and every
+SQL statement it ran, with EXPLAIN ANALYZE of the vector queries on Postgres. The plans
+are collected once the request's timings are stopped, so they do not count in them. The result
+is saved as a JSON report plus a .prof file loadable with pstats or snakeviz.
+
+Requests that are not profiled only pay for a context variable lookup per stage.
+"""
+import contextvars
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import uuid4
+
+from sqlalchemy import event
+
+_current: contextvars.ContextVar[Optional["RequestProfile"]] = contextvars.ContextVar("request_profile", default=None)
+
+
+class RequestProfile:
+    """
+    Everything captured for one request.
+    """
+
+    def __init__(self, endpoint: str, reason: str):
+        self.id = uuid4().hex
+        self.endpoint = endpoint
+        # "requested" through the header, or "sampled" in the background
+        self.reason = reason
+        self.started_at = time.time()
+        self.stages: List[Dict] = []
+        self.queries: List[Dict] = []
+        # (entry of queries, statement, parameters) of the statements to EXPLAIN
+        self.pending_explains: List[Tuple[Dict, str, Any]] = []
+        self.profiler = cProfile.Profile()
+        self.profiler_enabled = False
+        self._start = time.perf_counter()
+        self.total_ms: Optional[float] = None
+
+    def start(self):
+        try:
+            self.profiler.enable()
+            self.profiler_enabled = True
+        except ValueError:
+            # Another profiler is already active in this thread; keep stages and SQL only
+            pass
+        return _current.set(self)
+
+    def stop(self, token):
+        if self.profiler_enabled:
+            self.profiler.disable()
+        self.total_ms = (time.perf_counter() - self._start) * 1000
+        _current.reset(token)
+
+    def top_functions(self, limit: int = 40) -> str:
+        if not self.profiler_enabled:
+            return ""
+        out = io.StringIO()
+        pstats.Stats(self.profiler, stream=out).sort_stats("cumulative").print_stats(limit)
+        return out.getvalue()
+
+    def report(self) -> Dict:
+        return {
+            "id": self.id,
+            "endpoint": self.endpoint,
+            "reason": self.reason,
+            "started_at": self.started_at,
+            "total_ms": self.total_ms,
+            "stages": self.stages,
+            "queries": self.queries,
+            "cprofile": self.top_functions()
+        }
+
+
+def current() -> Optional[RequestProfile]:
+    """The profile of the request running in this context, if it is profiled"""
+    return _current.get()
+
+
+@contextmanager
+def stage(name: str):
+    """Times a named stage of the current request when it is profiled"""
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.stages.append({"stage": name, "ms": (time.perf_counter() - start) * 1000})
+
+
+def instrument_engine(engine, explain_vector_queries: bool):
+    """
+    Records the statements a profiled request runs on engine. With explain_vector_queries,
+    statements using the pgvector distance operator are kept for explain_queries.
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if _current.get() is not None:
+            conn.info.setdefault("profile_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        profile = _current.get()
+        if profile is None or not conn.info.get("profile_query_start"):
+            return
+        query = {
+            "statement": statement,
+            "ms": (time.perf_counter() - conn.info["profile_query_start"].pop()) * 1000
+        }
+        if explain_vector_queries and "<=>" in statement and not executemany:
+            profile.pending_explains.append((query, statement, parameters))
+        profile.queries.append(query)
+
+
+def explain_queries(profile: RequestProfile, engine):
+    """
+    Runs the statements kept by instrument_engine once more under EXPLAIN ANALYZE and
+    attaches the plans. Called after profile.stop(), so that the second execution does
+    not count in the request's stages and total.
+    """
+    for query, statement, parameters in profile.pending_explains:
+        # A raw connection does not fire the engine events, and is rolled back after
+        connection = engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            cursor.execute("EXPLAIN (ANALYZE, BUFFERS) " + statement, parameters)
+            query["explain_analyze"] = "\n".join(row[0] for row in cursor.fetchall())
+            cursor.close()
+        except Exception as e:
+            query["explain_analyze"] = f"EXPLAIN failed: {e}"
+        finally:
+            connection.rollback()
+            connection.close()
+    profile.pending_explains = []
+
+
+class ProfileStore:
+    """
+    Saves reports under a directory and keeps only the most recent max_files of them.
+    """
+
+    def __init__(self, directory: str, max_files: int = 200):
+        self.directory = directory
+        self.max_files = max_files
+        self._lock = threading.Lock()
+
+    def path(self, profile_id: str, extension: str) -> Optional[str]:
+        """Path of a saved artifact, or None for unknown or malformed ids"""
+        if not profile_id.isalnum():
+            return None
+        path = os.path.join(self.directory, f"{profile_id}.{extension}")
+        return path if os.path.exists(path) else None
+
+    def save(self, profile: RequestProfile):
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, f"{profile.id}.json"), "w") as f:
+                json.dump(profile.report(), f, indent=2)
+            if profile.profiler_enabled:
+                profile.profiler.dump_stats(os.path.join(self.directory, f"{profile.id}.prof"))
+            self._prune()
+
+    def list(self) -> List[Dict]:
+        """Saved reports, newest first"""
+        reports = []
+        for name in self._report_files():
+            with open(os.path.join(self.directory, name)) as f:
+                report = json.load(f)
+            reports.append({key: report[key] for key in ("id", "endpoint", "reason", "started_at", "total_ms")})
+        return reports
+
+    def _report_files(self) -> List[str]:
+        if not os.path.isdir(self.directory):
+            return []
+        names = [name for name in os.listdir(self.directory) if name.endswith(".json")]
+        return sorted(names, key=lambda name: os.path.getmtime(os.path.join(self.directory, name)), reverse=True)
+
+    def _prune(self):
+        for name in self._report_files()[self.max_files:]:
+            for extension in (".json", ".prof"):
+                path = os.path.join(self.directory, name[:-len(".json")] + extension)
+                if os.path.exists(path):
+                    os.remove(path)
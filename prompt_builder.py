@@ -0,0 +1,133 @@
+"""
+Builds the Mistral prompt for a verse summary within an input token budget. Long
+commentaries are cut down to the passages most relevant to the user's question.
+"""
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+from extractive import rank_by_similarity, split_sentences
+
+# Bump whenever PROMPT_TEMPLATE changes, so stored and logged summaries can be traced back
+# v1: full commentary pasted into the prompt
+# v2: commentary reduced to the most relevant passages when over the token budget
+PROMPT_VERSION = "v2"
+
+PROMPT_TEMPLATE = """Given this verse from the Bhagavad Gita and user's question:
+
+User's Question:
+{query}
+
+Translation:
+{translation}
+
+Commentary:
+{commentary}
+
+Please provide a concise summary (5-6 sentences) of the main teaching or message from this verse, addressing the user's question if relevant meaning, connect the dots of user's query with the learnings of Bhagwad Gita to guide the user."""
+
+# Placed between passages that were not adjacent in the original commentary
+PASSAGE_GAP = " [...] "
+
+
+def compress_commentary(passages: List[str], passage_embeddings: np.ndarray, query_embedding: np.ndarray,
+                        count_tokens: Callable[[str], int], token_budget: int) -> str:
+    """
+    Keeps the passages most similar to the query that fit in token_budget, in their
+    original order.
+
+    Args:
+        passages (List[str]): The commentary split into passages
+        passage_embeddings (np.ndarray): One embedding per passage
+        query_embedding (np.ndarray): The query embedding already computed for the search
+        count_tokens (Callable[[str], int]): Token counter
+        token_budget (int): Tokens available for the commentary
+
+    Returns:
+        str: The selected passages
+    """
+    chosen = []
+    used = 0
+    for index in rank_by_similarity(query_embedding, passage_embeddings):
+        cost = count_tokens(passages[index]) + count_tokens(PASSAGE_GAP)
+        if used + cost > token_budget:
+            continue
+        chosen.append(index)
+        used += cost
+
+    text = ""
+    previous = None
+    for index in sorted(chosen):
+        if previous is not None:
+            text += " " if index == previous + 1 else PASSAGE_GAP
+        text += passages[index]
+        previous = index
+    return text
+
+
+def build_prompt(query: str, translation: str, commentary: str, query_embedding: np.ndarray,
+                 encode_passages: Callable[[str], Tuple[List[str], np.ndarray]],
+                 count_tokens: Callable[[str], int], max_input_tokens: int) -> Tuple[str, Dict]:
+    """
+    Fills PROMPT_TEMPLATE, compressing the commentary when the full prompt would exceed
+    max_input_tokens.
+
+    Args:
+        query (str): The user's original question
+        translation (str): English translation of the verse
+        commentary (str): Commentary on the verse
+        query_embedding (np.ndarray): The query embedding already computed for the search
+        encode_passages (Callable): Splits a commentary into passages and embeds them
+        count_tokens (Callable[[str], int]): Token counter
+        max_input_tokens (int): Input token budget of the whole prompt
+
+    Returns:
+        Tuple[str, Dict]: The prompt, and prompt_version, tokens_before (full commentary)
+            and tokens_after (prompt actually sent)
+    """
+    full_prompt = PROMPT_TEMPLATE.format(query=query, translation=translation, commentary=commentary)
+    tokens_before = count_tokens(full_prompt)
+    stats = {"prompt_version": PROMPT_VERSION, "tokens_before": tokens_before, "tokens_after": tokens_before}
+    if tokens_before <= max_input_tokens:
+        return full_prompt, stats
+
+    fixed_tokens = count_tokens(PROMPT_TEMPLATE.format(query=query, translation=translation, commentary=""))
+    passages, passage_embeddings = encode_passages(commentary)
+    compressed = compress_commentary(passages, passage_embeddings, query_embedding, count_tokens,
+                                     max(0, max_input_tokens - fixed_tokens))
+
+    prompt = PROMPT_TEMPLATE.format(query=query, translation=translation, commentary=compressed)
+    stats["tokens_after"] = count_tokens(prompt)
+    return prompt, stats
+
+
+def split_passages(commentary: str, sentences_per_passage: int = 2) -> List[str]:
+    """
+    Groups the commentary's sentences into passages of a few sentences each.
+    """
+    sentences = split_sentences(commentary)
+    return [
+        " ".join(sentences[i:i + sentences_per_passage])
+        for i in range(0, len(sentences), sentences_per_passage)
+    ]
+
+
+# Query-independent prompt used by data/scripts/precompute_summaries.py
+PRECOMPUTED_PROMPT_VERSION = "precomputed-v1"
+
+PRECOMPUTED_PROMPT_TEMPLATE = """Given this verse from the {title}:
+
+Translation:
+{translation}
+{commentary_section}
+Please provide a concise summary (5-6 sentences) of the main teaching or message from this verse and how a reader can apply it in their life."""
+
+
+def build_precomputed_prompt(title: str, translation: str, commentary: str = "") -> str:
+    """
+    Fills PRECOMPUTED_PROMPT_TEMPLATE; the commentary section is left out for texts without one.
+    """
+    commentary_section = f"\nCommentary:\n{commentary}\n" if commentary else ""
+    return PRECOMPUTED_PROMPT_TEMPLATE.format(
+        title=title, translation=translation, commentary_section=commentary_section
+    )
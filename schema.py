@@ -0,0 +1,101 @@
+"""
+Table definitions shared by the app, the storage backends and the embedded bundle build,
+and the searchable texts (corpora) built on them. The embedded bundle uses the same tables
+and columns, with embeddings stored as float32 blobs.
+"""
+from sqlalchemy import Table, Column, Integer, Text as SQLText, MetaData
+
+from corpus import Corpus, EmbeddingSource
+
+metadata = MetaData()
+
+# Define tables with correct SQLAlchemy Text type
+questions_table = Table(
+    "questions",
+    metadata,
+    Column("question_id", Integer, primary_key=True),
+    Column("chapter_no", Integer),
+    Column("verse_no", Integer),
+    Column("possible_question", SQLText),
+    Column("question_embedding", SQLText)
+)
+
+info_table = Table(
+    "info",
+    metadata,
+    Column("chapter_no", Integer, primary_key=True),
+    Column("verse_no", Integer, primary_key=True),
+    Column("sanskrit_verse", SQLText),
+    Column("speaker_name", SQLText),
+    Column("english_translations", SQLText),
+    Column("commentary", SQLText),
+    Column("translation_embedding", SQLText),
+    Column("commentary_embedding", SQLText)
+)
+
+chapter_table = Table(
+    "chapter",
+    metadata,
+    Column("chapter_no", Integer, primary_key=True),
+    Column("chapter_heading", SQLText),
+    Column("chapter_desc_heading", SQLText),
+    Column("chapter_intro", SQLText)
+)
+
+pys_question_table = Table(
+    "pys_question",
+    metadata,
+    Column("question_id", Integer, primary_key=True),
+    Column("chapter_no", Integer),
+    Column("verse_no", Integer),
+    Column("sanskrit", SQLText),
+    Column("translation", SQLText),
+    Column("possible_question", SQLText),
+    Column("question_embedding", SQLText)
+)
+
+# Filled by data/scripts/precompute_summaries.py
+verse_summary_table = Table(
+    "verse_summary",
+    metadata,
+    Column("corpus", SQLText, primary_key=True),
+    Column("chapter_no", Integer, primary_key=True),
+    Column("verse_no", Integer, primary_key=True),
+    Column("summary", SQLText, nullable=False),
+    Column("prompt_version", SQLText, nullable=False),
+    Column("model", SQLText, nullable=False)
+)
+
+# Searchable texts. Adding a text means adding a Corpus here, not a new endpoint.
+GITA_CORPUS = Corpus(
+    name="gita",
+    title="Bhagavad Gita",
+    sources=[
+        EmbeddingSource("question", questions_table, "question_embedding"),
+        EmbeddingSource("translation", info_table, "translation_embedding"),
+        EmbeddingSource("commentary", info_table, "commentary_embedding"),
+    ],
+    details_table=info_table,
+    detail_columns={
+        "sanskrit_verse": "sanskrit_verse",
+        "speaker": "speaker_name",
+        "translation": "english_translations",
+        "commentary": "commentary",
+    },
+    has_speaker=True
+)
+
+PYS_CORPUS = Corpus(
+    name="pys",
+    title="Patanjali Yoga Sutras",
+    sources=[
+        EmbeddingSource("question", pys_question_table, "question_embedding"),
+    ],
+    details_table=pys_question_table,
+    detail_columns={
+        "sanskrit": "sanskrit",
+        "translation": "translation",
+    }
+)
+
+CORPORA = {corpus.name: corpus for corpus in (GITA_CORPUS, PYS_CORPUS)}
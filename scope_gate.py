@@ -0,0 +1,143 @@
+"""
+Cheap in-memory check that rejects clearly out-of-scope queries right after encoding,
+before any vector query runs. Each corpus is summarized by a few prototype embeddings
+(k-means centroids of its questions); a query further than the corpus threshold from
+every prototype of every searched corpus is out of scope.
+
+Prototypes and thresholds are fitted by data/scripts/calibrate_scope_gate.py.
+"""
+import threading
+from typing import Dict, Iterable
+
+import numpy as np
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
+
+
+def kmeans_prototypes(embeddings: np.ndarray, k: int, iterations: int = 25, seed: int = 0) -> np.ndarray:
+    """
+    Spherical k-means: clusters embeddings by cosine similarity and returns the k
+    normalized centroids.
+    """
+    points = normalize(embeddings)
+    k = min(k, len(points))
+    rng = np.random.default_rng(seed)
+    centroids = points[rng.choice(len(points), size=k, replace=False)]
+    for _ in range(iterations):
+        assignment = np.argmax(points @ centroids.T, axis=1)
+        for cluster in range(k):
+            members = points[assignment == cluster]
+            if len(members):
+                centroids[cluster] = members.sum(axis=0)
+        centroids = normalize(centroids)
+    return centroids
+
+
+class ScopeGate:
+    """
+    Per-corpus prototypes and distance thresholds, plus counters of how often the gate
+    fires and how often a sampled audit of the full search path disagrees with it.
+
+    Args:
+        prototypes (Dict[str, np.ndarray]): Corpus name -> (k, dim) prototype embeddings
+        thresholds (Dict[str, float]): Corpus name -> largest cosine distance to the nearest
+            prototype still considered in scope
+    """
+
+    def __init__(self, prototypes: Dict[str, np.ndarray], thresholds: Dict[str, float]):
+        self.prototypes = {name: normalize(vectors) for name, vectors in prototypes.items()}
+        self.thresholds = dict(thresholds)
+        self._lock = threading.Lock()
+        self._counters = {
+            "checked": 0,
+            "rejected": 0,
+            # Rejections re-run through the full path in the background
+            "audited": 0,
+            # Audited rejections the full path would have answered
+            "false_rejections": 0,
+            # Queries the gate let through that the full path then found irrelevant
+            "passed_irrelevant": 0,
+            "passed": 0,
+        }
+
+    @classmethod
+    def fit(cls, embeddings: Dict[str, np.ndarray], k: int, quantile: float, margin: float) -> "ScopeGate":
+        """
+        Fits k prototypes per corpus and sets each threshold so that the given quantile
+        of the corpus's own embeddings stays in scope, plus margin.
+
+        Args:
+            embeddings (Dict[str, np.ndarray]): Corpus name -> (rows, dim) embeddings the
+                full search ranks for it
+        """
+        prototypes = {name: kmeans_prototypes(vectors, k) for name, vectors in embeddings.items()}
+        thresholds = {
+            name: float(np.quantile(1.0 - np.max(normalize(vectors) @ prototypes[name].T, axis=1), quantile) + margin)
+            for name, vectors in embeddings.items()
+        }
+        return cls(prototypes, thresholds)
+
+    @classmethod
+    def load(cls, path: str) -> "ScopeGate":
+        """Reads the .npz file written by save()"""
+        with np.load(path) as data:
+            names = [str(name) for name in data["corpora"]]
+            return cls(
+                {name: data[f"{name}_prototypes"] for name in names},
+                {name: float(data[f"{name}_threshold"]) for name in names}
+            )
+
+    def save(self, path: str):
+        arrays = {"corpora": np.array(list(self.prototypes))}
+        for name, vectors in self.prototypes.items():
+            arrays[f"{name}_prototypes"] = vectors
+            arrays[f"{name}_threshold"] = np.float32(self.thresholds[name])
+        np.savez(path, **arrays)
+
+    def nearest_distance(self, query_vector: np.ndarray, corpus_name: str) -> float:
+        """Cosine distance from the query to the closest prototype of a corpus"""
+        return float(1.0 - np.max(self.prototypes[corpus_name] @ normalize(query_vector)))
+
+    def in_scope(self, query_vector: np.ndarray, corpus_names: Iterable[str]) -> bool:
+        """
+        Whether the query is close enough to any of the given corpora to be searched.
+        Corpora without prototypes are always searched.
+        """
+        in_scope = any(
+            name not in self.prototypes or self.nearest_distance(query_vector, name) <= self.thresholds[name]
+            for name in corpus_names
+        )
+        with self._lock:
+            self._counters["checked"] += 1
+            if not in_scope:
+                self._counters["rejected"] += 1
+        return in_scope
+
+    def record_audit(self, full_path_irrelevant: bool):
+        """Records the full path's verdict on a query the gate rejected"""
+        with self._lock:
+            self._counters["audited"] += 1
+            if not full_path_irrelevant:
+                self._counters["false_rejections"] += 1
+
+    def record_passed(self, full_path_irrelevant: bool):
+        """Records the full path's verdict on a query the gate let through"""
+        with self._lock:
+            self._counters["passed"] += 1
+            if full_path_irrelevant:
+                self._counters["passed_irrelevant"] += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counters = dict(self._counters)
+        return {
+            "thresholds": self.thresholds,
+            "prototypes": {name: len(vectors) for name, vectors in self.prototypes.items()},
+            "fire_rate": counters["rejected"] / counters["checked"] if counters["checked"] else None,
+            "false_rejection_rate": counters["false_rejections"] / counters["audited"] if counters["audited"] else None,
+            "missed_rejection_rate": counters["passed_irrelevant"] / counters["passed"] if counters["passed"] else None,
+            "counters": counters
+        }
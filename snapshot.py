@@ -0,0 +1,82 @@
+"""
+Read-only JSON resources built once at startup, with their ETag and compressed bodies
+computed up front, so verse and chapter lookups never touch the database and browsers
+and CDNs can cache them.
+"""
+import gzip
+import hashlib
+import json
+from typing import Dict, Hashable, Optional
+
+import brotli
+from flask import Request, Response
+
+# Bodies smaller than this are not worth compressing
+MIN_COMPRESS_SIZE = 256
+
+# Preferred first
+ENCODINGS = {
+    "br": lambda body: brotli.compress(body, quality=11),
+    "gzip": lambda body: gzip.compress(body, compresslevel=9, mtime=0),
+}
+
+
+class CachedResource:
+    """
+    A serialized JSON document with a strong ETag per content encoding.
+    """
+    __slots__ = ("bodies", "etags")
+
+    def __init__(self, payload):
+        body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        digest = hashlib.sha256(body).hexdigest()[:32]
+
+        self.bodies = {"identity": body}
+        self.etags = {"identity": f'"{digest}"'}
+        if len(body) >= MIN_COMPRESS_SIZE:
+            for encoding, compress in ENCODINGS.items():
+                self.bodies[encoding] = compress(body)
+                self.etags[encoding] = f'"{digest}-{encoding}"'
+
+    def negotiate(self, request: Request) -> str:
+        """Picks the content encoding to answer with from Accept-Encoding"""
+        for encoding in ENCODINGS:
+            if encoding in self.bodies and request.accept_encodings.quality(encoding) > 0:
+                return encoding
+        return "identity"
+
+    def response(self, request: Request, cache_control: str) -> Response:
+        """
+        Builds the response to a GET or HEAD, answering 304 when the client already holds
+        any representation of this resource.
+        """
+        encoding = self.negotiate(request)
+        if any(request.if_none_match.contains_weak(etag.strip('"')) for etag in self.etags.values()):
+            response = Response(status=304)
+        else:
+            response = Response(self.bodies[encoding], mimetype="application/json")
+            if encoding != "identity":
+                response.headers["Content-Encoding"] = encoding
+
+        response.headers["ETag"] = self.etags[encoding]
+        response.headers["Cache-Control"] = cache_control
+        response.headers["Vary"] = "Accept-Encoding"
+        return response
+
+
+class Snapshot:
+    """
+    CachedResources by key, e.g. ("gita", "verse", 2, 47).
+    """
+
+    def __init__(self):
+        self._resources: Dict[Hashable, CachedResource] = {}
+
+    def add(self, key: Hashable, payload):
+        self._resources[key] = CachedResource(payload)
+
+    def get(self, key: Hashable) -> Optional[CachedResource]:
+        return self._resources.get(key)
+
+    def __len__(self):
+        return len(self._resources)
@@ -10,10 +10,11 @@ document.addEventListener("DOMContentLoaded", () => {
   const pysResults = document.getElementById("pys-results");
   const gitaHelp = document.getElementById("gita-help");
   const pysHelp = document.getElementById("pys-help");
+  const suggestionList = document.getElementById("suggestions");
 
   // Validate DOM elements
   if (!queryInput || !searchButton || !helpButton || !helpDialog || !closeHelpButton || 
-      !searchModeSelect || !gitaResults || !pysResults || !gitaHelp || !pysHelp) {
+      !searchModeSelect || !gitaResults || !pysResults || !gitaHelp || !pysHelp || !suggestionList) {
     console.error('Required DOM elements not found');
     return;
   }
@@ -76,29 +77,99 @@ document.addEventListener("DOMContentLoaded", () => {
           container.querySelector(".sanskrit-text").textContent = data.sanskrit_verse;
           container.querySelector(".translation").textContent = data.translation;
           container.querySelector(".commentary").textContent = data.commentary;
-          container.querySelector(".summary").textContent = data.summary;
+          container.querySelector(".summary").textContent = data.summary ||
+              "The summary is unavailable right now. Please refer to the translation and commentary above.";
       } else {
-          container.querySelector(".verse-header").textContent = `Chapter ${data.chapter_no}, Verse ${data.verse_no}`;
-          container.querySelector(".sanskrit-text").textContent = data.sanskrit;
-          container.querySelector(".translation").textContent = data.translation;
+          const template = container.querySelector(".result");
+          container.querySelectorAll(".result.copy").forEach(result => result.remove());
+          data.results.forEach((sutra, index) => {
+              const result = index === 0 ? template : template.cloneNode(true);
+              if (index > 0) {
+                  result.classList.add("copy");
+                  container.appendChild(result);
+              }
+              result.querySelector(".verse-header").textContent = `Chapter ${sutra.chapter_no}, Verse ${sutra.verse_no}`;
+              result.querySelector(".sanskrit-text").textContent = sutra.sanskrit;
+              result.querySelector(".translation").textContent = sutra.translation;
+          });
       }
 
       // Smooth scroll to results
       container.scrollIntoView({ behavior: 'smooth' });
   };
 
+  // Incremented by every search, so that polls started by an earlier search stop
+  let currentSearch = 0;
+
+  // Swaps the precomputed summary for the question-specific one once it is ready
+  const pollPersonalizedSummary = async (summaryId, search, attempts = 15) => {
+      for (let attempt = 0; attempt < attempts; attempt++) {
+          await new Promise(resolve => setTimeout(resolve, 1000));
+          if (search !== currentSearch) {
+              return;
+          }
+          const response = await fetch(`http://localhost:5000/api/summary/${summaryId}`);
+          if (!response.ok || search !== currentSearch) {
+              return;
+          }
+          const data = await response.json();
+          if (search !== currentSearch) {
+              return;
+          }
+          if (data.status === 'done') {
+              // An extractive fallback is no better than the precomputed summary already shown
+              if (data.summary_source === 'llm') {
+                  gitaResults.querySelector(".summary").textContent = data.summary;
+              }
+              return;
+          }
+      }
+  };
+
+  // Typeahead from the question bank; picking one of them skips the search on the server
+  let suggestions = [];
+  let suggestTimer = null;
+
+  const updateSuggestions = async () => {
+      const query = queryInput.value.trim();
+      const mode = searchModeSelect.value;
+      if (query.length < 2) {
+          suggestions = [];
+          suggestionList.replaceChildren();
+          return;
+      }
+      const response = await fetch(`http://localhost:5000/api/suggest?q=${encodeURIComponent(query)}&corpus=${mode}`);
+      if (!response.ok || queryInput.value.trim() !== query || searchModeSelect.value !== mode) {
+          return;
+      }
+      suggestions = (await response.json()).suggestions;
+      suggestionList.replaceChildren(...suggestions.map(suggestion => {
+          const option = document.createElement("option");
+          option.value = suggestion.question;
+          return option;
+      }));
+  };
+
   const searchVerse = async (query, mode) => {
+      const search = ++currentSearch;
       try {
           searchButton.disabled = true;
           queryInput.disabled = true;
           
           const endpoint = mode === 'gita' ? '/api/search' : '/api/search_pys';
+          const body = mode === 'gita'
+              ? { query, summary_mode: 'precomputed', personalize: true }
+              : { query };
+          const suggestion = suggestions.find(s => s.question.trim() === query && s.corpus === mode);
+          if (suggestion) {
+              body.question_id = suggestion.question_id;
+          }
           const response = await fetch(`http://localhost:5000${endpoint}`, {
               method: 'POST',
               headers: {
                   'Content-Type': 'application/json',
               },
-              body: JSON.stringify({ query })
+              body: JSON.stringify(body)
           });
 
           if (!response.ok) {
@@ -107,6 +178,9 @@ document.addEventListener("DOMContentLoaded", () => {
 
           const data = await response.json();
           displayResults(data, mode);
+          if (data.personalized_summary_id) {
+              pollPersonalizedSummary(data.personalized_summary_id, search).catch(error => console.error('Error:', error));
+          }
       } catch (error) {
           console.error('Error:', error);
           alert('Error performing search. Please try again.');
@@ -126,8 +200,17 @@ document.addEventListener("DOMContentLoaded", () => {
       searchVerse(query, searchModeSelect.value);
   });
 
+  queryInput.addEventListener("input", () => {
+      clearTimeout(suggestTimer);
+      suggestTimer = setTimeout(() => {
+          updateSuggestions().catch(error => console.error('Error:', error));
+      }, 150);
+  });
+
   searchModeSelect.addEventListener("change", () => {
       updatePlaceholder();
+      suggestions = [];
+      suggestionList.replaceChildren();
       gitaHelp.classList.toggle("hidden");
       pysHelp.classList.toggle("hidden");
   });
@@ -0,0 +1,700 @@
+"""
+Storage backends behind the search functions in app.py.
+
+PostgresStorage ranks with pgvector inside Postgres. EmbeddedStorage reads a single SQLite
+bundle built by data/scripts/build_bundle.py and ranks in memory with NumPy, for
+deployments without a Postgres server. Both answer with the same shapes, so app.py does
+not know which one it talks to.
+"""
+import json
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import (LargeBinary, Table, bindparam, cast, create_engine, func, literal, select, tuple_,
+                        type_coerce, union_all)
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.types import UserDefinedType
+
+from corpus import Corpus
+from schema import (CORPORA, PYS_CORPUS, chapter_table, info_table, pys_question_table,
+                    verse_summary_table)
+
+# (chapter_no, verse_no, similarity_score, source), as returned by rank()
+RankedMatch = Tuple[int, int, float, str]
+
+
+@lru_cache(maxsize=8)
+def _pgvector_format(dimensions: int) -> str:
+    # %.9g round-trips every float32 exactly, in one C-level formatting call
+    return "[" + ",".join(["%.9g"] * dimensions) + "]"
+
+
+def to_pgvector(embedding: np.ndarray) -> str:
+    """
+    Formats an embedding as a pgvector literal.
+    """
+    values = np.asarray(embedding, dtype=np.float32).tolist()
+    return _pgvector_format(len(values)) % tuple(values)
+
+
+class PGVector(UserDefinedType):
+    """
+    pgvector's vector type for bound query embeddings, which accepts NumPy arrays.
+
+    psycopg2 sends every parameter as text, so the pgvector binary format is not
+    available; the embedding is formatted once when the statement is executed.
+    """
+    cache_ok = True
+
+    def get_col_spec(self, **kw):
+        return "VECTOR"
+
+    def bind_processor(self, dialect):
+        return to_pgvector
+
+
+def query_vector_expression(query_vector: np.ndarray):
+    """
+    Binds the query embedding once, in a CTE, and returns the scalar subquery reading it.
+    Every distance in a statement refers to this subquery, so Postgres receives and
+    parses the vector literal once per statement rather than once per use.
+    """
+    query = select(cast(bindparam("query_vector", query_vector, type_=PGVector()), PGVector()).label("embedding"))
+    return select(query.cte("query_vector").c.embedding).scalar_subquery()
+
+
+def verse_filter_clauses(table: Table, chapter_range: Optional[Tuple[int, int]] = None,
+                         speaker_name: Optional[str] = None,
+                         chapters: Optional[Sequence[int]] = None) -> list:
+    """
+    Builds the WHERE predicates for a table keyed by (chapter_no, verse_no), so that
+    filtering happens inside the similarity scan rather than on its output.
+
+    Tables without a speaker_name column are restricted through the matching info rows.
+    """
+    clauses = []
+    if chapter_range:
+        clauses.append(table.c.chapter_no.between(chapter_range[0], chapter_range[1]))
+    if chapters is not None:
+        clauses.append(table.c.chapter_no.in_(list(chapters)))
+    if speaker_name:
+        speaker_match = func.lower(info_table.c.speaker_name) == speaker_name.lower()
+        if "speaker_name" in table.c:
+            clauses.append(speaker_match)
+        else:
+            clauses.append(
+                tuple_(table.c.chapter_no, table.c.verse_no).in_(
+                    select(info_table.c.chapter_no, info_table.c.verse_no).where(speaker_match)
+                )
+            )
+    return clauses
+
+
+class SQLStorage(ABC):
+    """
+    The lookups both backends run as plain SQL: verse details, precomputed summaries and
+    the rows of the read-only snapshot. Subclasses add the vector search.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.Session = sessionmaker(bind=engine)
+
+    @abstractmethod
+    def rank(self, corpus: Corpus, query_vector: np.ndarray, limit: int = 5,
+             chapter_range: Optional[Tuple[int, int]] = None,
+             speaker_name: Optional[str] = None,
+             chapters: Optional[Sequence[int]] = None) -> List[RankedMatch]:
+        """
+        Ranks every embedding source of a corpus against a query embedding.
+
+        Args:
+            corpus (Corpus): The text to search
+            query_vector (np.ndarray): The encoded query
+            limit (int): Number of results to return per embedding source
+            chapter_range (Tuple[int, int], optional): Inclusive (start, end) chapters to search in
+            speaker_name (str, optional): Only match verses spoken by this speaker
+            chapters (Sequence[int], optional): Only search these chapters, e.g. the ones
+                picked by a ChapterRouter
+
+        Returns:
+            List[RankedMatch]: All sources' results sorted by similarity score (cosine distance)
+        """
+
+    @abstractmethod
+    def source_embeddings(self, source) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Reads every embedding of an EmbeddingSource.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: The chapter_no of each row and the (rows, dim) float32 matrix
+        """
+
+    @abstractmethod
+    def search_pys(self, query_vector: np.ndarray, limit: int = 5,
+                   chapter_range: Optional[Tuple[int, int]] = None,
+                   after: Optional[Tuple[float, int, int]] = None) -> List[Dict]:
+        """
+        Finds the closest distinct sutras, each ranked by its best matching question.
+
+        Args:
+            query_vector (np.ndarray): The encoded query
+            limit (int): Number of sutras to return
+            chapter_range (Tuple[int, int], optional): Inclusive (start, end) padas to search in
+            after (Tuple[float, int, int], optional): Only return sutras whose
+                (similarity, chapter_no, verse_no) sorts after this key
+
+        Returns:
+            List[Dict]: chapter_no, verse_no, sanskrit, translation, matched_question and
+                similarity_score of each sutra, best first
+        """
+
+    def question_bank(self, corpus: Corpus) -> Tuple[List[Dict], np.ndarray]:
+        """
+        Reads the curated questions of a corpus (its "question" embedding source) with their
+        embeddings. When the questions live in the corpus's details table, the detail
+        columns of their verse are read too.
+
+        Returns:
+            Tuple[List[Dict], np.ndarray]: question_id, chapter_no, verse_no, question and
+                any detail columns of each question, and the (questions, dim) float32 embeddings
+        """
+        source = next(source for source in corpus.sources if source.name == "question")
+        table = source.table
+        details = {}
+        if table is corpus.details_table:
+            details = {key: table.c[column] for key, column in corpus.detail_columns.items()}
+        query = select(
+            table.c.question_id,
+            table.c.chapter_no,
+            table.c.verse_no,
+            table.c.possible_question.label("question"),
+            *(column.label(key) for key, column in details.items()),
+            self._embedding_column(source).label("embedding")
+        ).order_by(table.c.question_id)
+        with self.Session() as db:
+            rows = db.execute(query).mappings().all()
+        questions = [{key: row[key] for key in row.keys() if key != "embedding"} for row in rows]
+        return questions, np.array([self._decode_embedding(row["embedding"]) for row in rows], dtype=np.float32)
+
+    def _embedding_column(self, source):
+        return source.embedding
+
+    @abstractmethod
+    def _decode_embedding(self, value) -> np.ndarray:
+        """Turns a value of an embedding column, as _embedding_column selects it, into a vector"""
+
+    @staticmethod
+    def _check_speaker(corpus: Corpus, speaker_name: Optional[str]):
+        if speaker_name and not corpus.has_speaker:
+            raise ValueError(f"speaker_name is not available for the {corpus.title}")
+
+    def verse_details(self, corpus: Corpus, chapter_no: int, verse_no: int) -> Optional[Dict]:
+        """
+        Fetches the detail columns of one verse, keyed as in corpus.detail_columns.
+        """
+        with self.Session() as db:
+            row = db.execute(corpus.details_query(chapter_no, verse_no)).mappings().first()
+        return dict(row) if row else None
+
+    def precomputed_summary(self, corpus_name: str, chapter_no: int, verse_no: int,
+                            prompt_version: str) -> Optional[str]:
+        """
+        Fetches the query-independent summary stored by data/scripts/precompute_summaries.py
+        with the given prompt version. Returns None when there is none, including when the
+        verse_summary table has not been created yet because the script never ran.
+        """
+        query = select(verse_summary_table.c.summary).where(
+            (verse_summary_table.c.corpus == corpus_name) &
+            (verse_summary_table.c.chapter_no == chapter_no) &
+            (verse_summary_table.c.verse_no == verse_no) &
+            (verse_summary_table.c.prompt_version == prompt_version)
+        )
+        with self.Session() as db:
+            try:
+                return db.execute(query).scalar()
+            except (OperationalError, ProgrammingError):
+                # Missing table: "no such table" on SQLite, UndefinedTable on Postgres
+                return None
+
+    def gita_verses(self) -> List[Dict]:
+        """Every row of info without the embeddings, in reading order"""
+        query = select(
+            info_table.c.chapter_no,
+            info_table.c.verse_no,
+            info_table.c.sanskrit_verse,
+            info_table.c.speaker_name,
+            info_table.c.english_translations,
+            info_table.c.commentary
+        ).order_by(info_table.c.chapter_no, info_table.c.verse_no)
+        with self.Session() as db:
+            return [dict(row) for row in db.execute(query).mappings()]
+
+    def gita_chapters(self) -> List[Dict]:
+        """Every row of chapter, in reading order"""
+        with self.Session() as db:
+            return [dict(row) for row in db.execute(
+                select(chapter_table).order_by(chapter_table.c.chapter_no)
+            ).mappings()]
+
+    def pys_sutras(self) -> List[Dict]:
+        """One row per sutra (the first of its questions), in reading order"""
+        first_question = select(func.min(pys_question_table.c.question_id)).group_by(
+            pys_question_table.c.chapter_no, pys_question_table.c.verse_no
+        )
+        query = select(
+            pys_question_table.c.chapter_no,
+            pys_question_table.c.verse_no,
+            pys_question_table.c.sanskrit,
+            pys_question_table.c.translation
+        ).where(
+            pys_question_table.c.question_id.in_(first_question)
+        ).order_by(pys_question_table.c.chapter_no, pys_question_table.c.verse_no)
+        with self.Session() as db:
+            return [dict(row) for row in db.execute(query).mappings()]
+
+
+def rank_statement(corpus: Corpus, query_vector: np.ndarray, limit: int,
+                   chapter_range: Optional[Tuple[int, int]] = None,
+                   speaker_name: Optional[str] = None,
+                   chapters: Optional[Sequence[int]] = None):
+    """
+    Builds one statement ranking every embedding source of a corpus, returning
+    (chapter_no, verse_no, similarity, source_index) rows. All sources share one query
+    vector bind, so it is sent and parsed once per request.
+    """
+    query_embedding = query_vector_expression(query_vector)
+    ranked = []
+    for i, source in enumerate(corpus.sources):
+        clauses = verse_filter_clauses(source.table, chapter_range, speaker_name, chapters)
+        top = source.rank_query(query_embedding, limit, clauses).subquery(f"{source.name}_top")
+        ranked.append(select(top, literal(i).label("source_index")))
+    return union_all(*ranked)
+
+
+class PostgresStorage(SQLStorage):
+    """
+    Ranks with the pgvector cosine distance operator inside Postgres.
+    """
+
+    def __init__(self, database_url: str):
+        # This postgres:: replacement is needed for sqlalchemy 1.4 and above
+        if database_url.startswith("postgres://"):
+            database_url = database_url.replace("postgres://", "postgresql://", 1)
+        super().__init__(create_engine(database_url))
+
+    def rank(self, corpus, query_vector, limit=5, chapter_range=None, speaker_name=None, chapters=None):
+        self._check_speaker(corpus, speaker_name)
+        query = rank_statement(corpus, query_vector, limit, chapter_range, speaker_name, chapters)
+        with self.Session() as db:
+            rows = db.execute(query).all()
+
+        # Sort all results by similarity score, ties in source order
+        rows.sort(key=lambda r: (r[2], r[3]))
+        return [(r[0], r[1], r[2], corpus.sources[r[3]].name) for r in rows]
+
+    def source_embeddings(self, source):
+        with self.Session() as db:
+            rows = db.execute(select(source.table.c.chapter_no, source.embedding)).all()
+        return (np.array([r[0] for r in rows], dtype=np.int32),
+                np.array([self._decode_embedding(r[1]) for r in rows], dtype=np.float32))
+
+    def _decode_embedding(self, value):
+        # pgvector columns come back in their text form, which is a JSON array
+        return json.loads(value)
+
+    def search_pys(self, query_vector, limit=5, chapter_range=None, after=None):
+        distance = pys_question_table.c.question_embedding.op('<=>')(query_vector_expression(query_vector))
+
+        # Best matching question per sutra
+        best_per_sutra = select(
+            pys_question_table.c.question_id,
+            pys_question_table.c.chapter_no,
+            pys_question_table.c.verse_no,
+            distance.label("similarity")
+        ).where(
+            *verse_filter_clauses(pys_question_table, chapter_range)
+        ).distinct(
+            pys_question_table.c.chapter_no,
+            pys_question_table.c.verse_no
+        ).order_by(
+            pys_question_table.c.chapter_no,
+            pys_question_table.c.verse_no,
+            distance
+        ).subquery("best_per_sutra")
+
+        # One page of sutras, ordered by similarity with (chapter_no, verse_no) as tie-breaker
+        sort_key = (best_per_sutra.c.similarity, best_per_sutra.c.chapter_no, best_per_sutra.c.verse_no)
+        page = select(best_per_sutra)
+        if after:
+            page = page.where(tuple_(*sort_key) > tuple_(*after))
+        page = page.order_by(*sort_key).limit(limit).subquery("page")
+
+        search_query = select(
+            page.c.chapter_no,
+            page.c.verse_no,
+            page.c.similarity,
+            pys_question_table.c.sanskrit,
+            pys_question_table.c.translation,
+            pys_question_table.c.possible_question
+        ).join_from(
+            page, pys_question_table, pys_question_table.c.question_id == page.c.question_id
+        ).order_by(
+            page.c.similarity, page.c.chapter_no, page.c.verse_no
+        )
+
+        with self.Session() as db:
+            return [
+                {
+                    "chapter_no": row.chapter_no,
+                    "verse_no": row.verse_no,
+                    "sanskrit": row.sanskrit,
+                    "translation": row.translation,
+                    "matched_question": row.possible_question,
+                    "similarity_score": row.similarity
+                }
+                for row in db.execute(search_query)
+            ]
+
+
+def normalize_query(query_vector: np.ndarray) -> np.ndarray:
+    query = np.asarray(query_vector, dtype=np.float32)
+    return query / max(float(np.linalg.norm(query)), 1e-12)
+
+
+class VectorIndex:
+    """
+    The embeddings of one source held in memory as a normalized float32 matrix, with
+    parallel arrays of row ids, chapters, verses and (lower-cased) speakers that filters
+    are evaluated on. Rows are kept in chapter order, so that searching a few chapters
+    only scores their slices of the matrix.
+    """
+    __slots__ = ("ids", "chapters", "verses", "matrix", "chapter_slices", "speaker_masks")
+
+    def __init__(self, ids: np.ndarray, chapters: np.ndarray, verses: np.ndarray,
+                 embeddings: np.ndarray, speakers: Optional[np.ndarray] = None):
+        order = np.lexsort((np.asarray(verses), np.asarray(chapters)))
+        self.ids = np.asarray(ids, dtype=np.int64)[order]
+        self.chapters = np.asarray(chapters, dtype=np.int32)[order]
+        self.verses = np.asarray(verses, dtype=np.int32)[order]
+        matrix = np.asarray(embeddings, dtype=np.float32)[order]
+        self.matrix = matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        # chapter_no -> (start, end) rows
+        chapter_nos, starts, counts = np.unique(self.chapters, return_index=True, return_counts=True)
+        self.chapter_slices = {int(c): (int(s), int(s + n)) for c, s, n in zip(chapter_nos, starts, counts)}
+        # Speaker filters are precomputed as one boolean mask per speaker
+        self.speaker_masks = {}
+        if speakers is not None:
+            speakers = np.asarray(speakers, dtype=object)[order]
+            self.speaker_masks = {name: speakers == name for name in set(speakers) if name}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def filter_mask(self, chapter_range: Optional[Tuple[int, int]] = None,
+                    speaker_name: Optional[str] = None) -> Optional[np.ndarray]:
+        """
+        Rows passing the filters, or None when there are no filters.
+        """
+        mask = None
+        if chapter_range:
+            mask = (self.chapters >= chapter_range[0]) & (self.chapters <= chapter_range[1])
+        if speaker_name:
+            speaker_mask = self.speaker_masks.get(speaker_name.lower(), np.zeros(len(self), dtype=bool))
+            mask = speaker_mask if mask is None else mask & speaker_mask
+        return mask
+
+    def nbytes(self) -> int:
+        """Memory held by the arrays of the index"""
+        arrays = [self.ids, self.chapters, self.verses, *self.speaker_masks.values()]
+        arrays += [getattr(self, name) for name in ("matrix", "codes", "scales")
+                   if getattr(self, name, None) is not None]
+        return sum(array.nbytes for array in arrays)
+
+    def dense(self) -> np.ndarray:
+        """The normalized float32 embeddings, one row per vector"""
+        return self.matrix
+
+    def _slice_distances(self, query: np.ndarray, start: int, end: int) -> np.ndarray:
+        return 1.0 - self.matrix[start:end] @ query
+
+    def distances(self, query_vector: np.ndarray) -> np.ndarray:
+        """
+        Cosine distance of every row to the query, as pgvector's <=> computes it.
+        """
+        return self._slice_distances(normalize_query(query_vector), 0, len(self))
+
+    def top(self, query_vector: np.ndarray, limit: int, mask: Optional[np.ndarray] = None,
+            chapters: Optional[Sequence[int]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the row indices and distances of the closest rows passing the mask, only
+        scoring the given chapters when there are any.
+        """
+        if chapters is None:
+            candidates = np.arange(len(self))
+            distances = self.distances(query_vector)
+        else:
+            slices = [self.chapter_slices[c] for c in sorted(set(chapters)) if c in self.chapter_slices]
+            if not slices:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+            query = normalize_query(query_vector)
+            candidates = np.concatenate([np.arange(start, end) for start, end in slices])
+            distances = np.empty(len(self), dtype=np.float32)
+            for start, end in slices:
+                distances[start:end] = self._slice_distances(query, start, end)
+        if mask is not None:
+            candidates = candidates[mask[candidates]]
+        if len(candidates) > limit:
+            partition = np.argpartition(distances[candidates], limit)[:limit]
+            candidates = candidates[partition]
+        order = np.argsort(distances[candidates], kind="stable")
+        return candidates[order], distances[candidates[order]]
+
+
+class QuantizedVectorIndex(VectorIndex):
+    """
+    A VectorIndex storing its embeddings as float16, or as int8 with one scale per vector,
+    to cut the memory every worker holds. Candidates are ranked on the compact codes and
+    the best limit * rescore_factor of them are rescored exactly with the float32
+    embeddings returned by exact(rows).
+
+    Args:
+        precision (str): "float16" or "int8"
+        rescore_factor (int): Candidates rescored per result; 0 returns the approximate ranking
+        exact (Callable, optional): Returns the float32 embeddings of the given rows
+    """
+    __slots__ = ("codes", "scales", "precision", "rescore_factor", "exact")
+
+    # Rows dequantized at a time, to bound the temporary float32 copy
+    BLOCK_ROWS = 4096
+
+    def __init__(self, ids, chapters, verses, embeddings, speakers=None, precision: str = "int8",
+                 rescore_factor: int = 4, exact=None):
+        super().__init__(ids, chapters, verses, embeddings, speakers)
+        if precision == "float16":
+            self.codes = self.matrix.astype(np.float16)
+            self.scales = None
+        elif precision == "int8":
+            self.scales = np.maximum(np.abs(self.matrix).max(axis=1), 1e-12).astype(np.float32) / 127
+            self.codes = np.round(self.matrix / self.scales[:, None]).astype(np.int8)
+        else:
+            raise ValueError(f"Unknown precision '{precision}', expected 'float16' or 'int8'")
+        self.matrix = None
+        self.precision = precision
+        self.rescore_factor = rescore_factor
+        self.exact = exact
+
+    def dense(self):
+        return self._dequantize(0, len(self))
+
+    def _dequantize(self, start: int, end: int) -> np.ndarray:
+        block = self.codes[start:end].astype(np.float32)
+        if self.scales is not None:
+            block *= self.scales[start:end, None]
+        return block
+
+    def _slice_distances(self, query, start, end):
+        distances = np.empty(end - start, dtype=np.float32)
+        for block_start in range(start, end, self.BLOCK_ROWS):
+            block_end = min(end, block_start + self.BLOCK_ROWS)
+            distances[block_start - start:block_end - start] = 1.0 - self._dequantize(block_start, block_end) @ query
+        return distances
+
+    def top(self, query_vector, limit, mask=None, chapters=None):
+        if not self.rescore_factor or self.exact is None:
+            return super().top(query_vector, limit, mask, chapters)
+        rows, _ = super().top(query_vector, limit * self.rescore_factor, mask, chapters)
+        if not len(rows):
+            return rows, np.empty(0, dtype=np.float32)
+        exact = self.exact(rows)
+        exact = exact / np.maximum(np.linalg.norm(exact, axis=1, keepdims=True), 1e-12)
+        distances = 1.0 - exact @ normalize_query(query_vector)
+        order = np.argsort(distances, kind="stable")[:limit]
+        return rows[order], distances[order]
+
+
+class EmbeddedStorage(SQLStorage):
+    """
+    Reads everything from one SQLite file and keeps the embeddings in VectorIndexes.
+
+    Args:
+        bundle_path (str): SQLite file built by data/scripts/build_bundle.py
+        precision (str): "float32", or "float16"/"int8" for QuantizedVectorIndexes that
+            rescore their candidates with the float32 embeddings read back from the bundle
+        rescore_factor (int): Candidates rescored per result of a quantized index
+    """
+
+    def __init__(self, bundle_path: str, precision: str = "float32", rescore_factor: int = 4):
+        super().__init__(create_engine(f"sqlite:///{bundle_path}"))
+        self.indexes: Dict[Tuple[str, str], VectorIndex] = {}
+        for corpus in CORPORA.values():
+            speakers = self._load_speakers() if corpus.has_speaker else None
+            for source in corpus.sources:
+                # search_pys needs the exact distance of every question, so that small
+                # index always stays float32
+                source_precision = "float32" if corpus is PYS_CORPUS else precision
+                self.indexes[(corpus.name, source.name)] = self._load_index(
+                    source, speakers, source_precision, rescore_factor
+                )
+
+    def _load_speakers(self) -> Dict[Tuple[int, int], str]:
+        with self.Session() as db:
+            rows = db.execute(select(info_table.c.chapter_no, info_table.c.verse_no, info_table.c.speaker_name))
+            return {(r[0], r[1]): (r[2] or "").lower() for r in rows}
+
+    def _load_index(self, source, speakers: Optional[Dict[Tuple[int, int], str]],
+                    precision: str = "float32", rescore_factor: int = 4) -> VectorIndex:
+        # ids are the question_id of question tables; info is keyed by (chapter_no, verse_no) alone
+        key_columns = list(source.table.primary_key.columns)
+        query = select(
+            key_columns[0],
+            source.table.c.chapter_no,
+            source.table.c.verse_no,
+            type_coerce(source.embedding, LargeBinary)
+        ).order_by(*key_columns)
+        with self.Session() as db:
+            rows = db.execute(query).all()
+
+        ids = [r[0] if len(key_columns) == 1 else i for i, r in enumerate(rows)]
+        chapters = [r[1] for r in rows]
+        verses = [r[2] for r in rows]
+        embeddings = np.vstack([np.frombuffer(r[3], dtype=np.float32) for r in rows])
+        verse_speakers = None
+        if speakers is not None:
+            verse_speakers = [speakers.get((c, v), "") for c, v in zip(chapters, verses)]
+        if precision == "float32":
+            return VectorIndex(ids, chapters, verses, embeddings, verse_speakers)
+
+        index = QuantizedVectorIndex(ids, chapters, verses, embeddings, verse_speakers,
+                                     precision=precision, rescore_factor=rescore_factor)
+        index.exact = lambda rows: self._exact_embeddings(source, index, rows, len(key_columns) == 1)
+        return index
+
+    def _exact_embeddings(self, source, index: VectorIndex, rows: np.ndarray, keyed_by_id: bool) -> np.ndarray:
+        """
+        Reads the float32 embeddings of some rows of an index back from the bundle.
+        """
+        embedding = type_coerce(source.embedding, LargeBinary)
+        if keyed_by_id:
+            keys = [int(index.ids[row]) for row in rows]
+            key_column = list(source.table.primary_key.columns)[0]
+            query = select(key_column, embedding).where(key_column.in_(keys))
+            with self.Session() as db:
+                blobs = {r[0]: r[1] for r in db.execute(query)}
+        else:
+            keys = [(int(index.chapters[row]), int(index.verses[row])) for row in rows]
+            query = select(source.table.c.chapter_no, source.table.c.verse_no, embedding).where(
+                tuple_(source.table.c.chapter_no, source.table.c.verse_no).in_(keys)
+            )
+            with self.Session() as db:
+                blobs = {(r[0], r[1]): r[2] for r in db.execute(query)}
+        return np.vstack([np.frombuffer(blobs[key], dtype=np.float32) for key in keys])
+
+    def rank(self, corpus, query_vector, limit=5, chapter_range=None, speaker_name=None, chapters=None):
+        self._check_speaker(corpus, speaker_name)
+
+        results = []
+        for source in corpus.sources:
+            index = self.indexes[(corpus.name, source.name)]
+            rows, distances = index.top(query_vector, limit, index.filter_mask(chapter_range, speaker_name),
+                                        chapters)
+            results.extend(
+                (int(index.chapters[row]), int(index.verses[row]), float(distance), source.name)
+                for row, distance in zip(rows, distances)
+            )
+
+        # Sort all results by similarity score
+        results.sort(key=lambda x: x[2])
+        return results
+
+    def _embedding_column(self, source):
+        return type_coerce(source.embedding, LargeBinary)
+
+    def _decode_embedding(self, value):
+        return np.frombuffer(value, dtype=np.float32)
+
+    def source_embeddings(self, source):
+        corpus = next(c for c in CORPORA.values() if source in c.sources)
+        index = self.indexes[(corpus.name, source.name)]
+        return index.chapters, index.dense()
+
+    def search_pys(self, query_vector, limit=5, chapter_range=None, after=None):
+        index = self.indexes[(PYS_CORPUS.name, PYS_CORPUS.sources[0].name)]
+        distances = index.distances(query_vector)
+        rows = np.arange(len(index))
+        mask = index.filter_mask(chapter_range)
+        if mask is not None:
+            rows = rows[mask]
+
+        # Best matching question per sutra: the first row of each verse in distance order
+        rows = rows[np.argsort(distances[rows], kind="stable")]
+        verse_keys = index.chapters[rows].astype(np.int64) * 100000 + index.verses[rows]
+        _, first = np.unique(verse_keys, return_index=True)
+        best = rows[first]
+
+        # Order by (similarity, chapter_no, verse_no), like the Postgres query
+        best = best[np.lexsort((index.verses[best], index.chapters[best], distances[best]))]
+        page = []
+        for row in best:
+            key = (float(distances[row]), int(index.chapters[row]), int(index.verses[row]))
+            if after and key <= tuple(after):
+                continue
+            page.append((row, key))
+            if len(page) == limit:
+                break
+        if not page:
+            return []
+
+        # Only the page's rows are read back with their text columns
+        ids = [int(index.ids[row]) for row, _ in page]
+        with self.Session() as db:
+            texts = {
+                r.question_id: r for r in db.execute(select(
+                    pys_question_table.c.question_id,
+                    pys_question_table.c.sanskrit,
+                    pys_question_table.c.translation,
+                    pys_question_table.c.possible_question
+                ).where(pys_question_table.c.question_id.in_(ids)))
+            }
+
+        return [
+            {
+                "chapter_no": chapter_no,
+                "verse_no": verse_no,
+                "sanskrit": texts[question_id].sanskrit,
+                "translation": texts[question_id].translation,
+                "matched_question": texts[question_id].possible_question,
+                "similarity_score": similarity
+            }
+            for question_id, (_, (similarity, chapter_no, verse_no)) in zip(ids, page)
+        ]
+
+
+def create_storage(backend: str, database_url: Optional[str] = None,
+                   bundle_path: Optional[str] = None, embedding_precision: str = "float32",
+                   rescore_factor: int = 4) -> SQLStorage:
+    """
+    Builds the configured storage backend.
+
+    Args:
+        backend (str): "postgres" or "embedded"
+        database_url (str, optional): Required for postgres
+        bundle_path (str, optional): Required for embedded
+        embedding_precision (str): In-memory precision of the embedded backend's embeddings
+        rescore_factor (int): Candidates rescored exactly per result when quantized
+
+    Raises:
+        ValueError: If the backend is unknown or its setting is missing
+    """
+    if backend == "postgres":
+        if not database_url:
+            raise ValueError("DATABASE_URL not set in .env file")
+        return PostgresStorage(database_url)
+    if backend == "embedded":
+        if not bundle_path:
+            raise ValueError("EMBEDDED_BUNDLE not set in .env file")
+        return EmbeddedStorage(bundle_path, embedding_precision, rescore_factor)
+    raise ValueError(f"Unknown STORAGE_BACKEND '{backend}', expected 'postgres' or 'embedded'")
@@ -0,0 +1,191 @@
+"""
+Typeahead over the curated question bank (the possible_question rows of every corpus).
+
+Everything is built once at startup. A prefix trie over the words of the questions
+finds the questions matching what has been typed so far, and a list of the nearest
+questions by embedding is kept for each question. Suggestions are ranked by how often
+a question appears in the other questions' neighbour lists, so the most representative
+questions come first. Neighbour lists fill up short suggestion lists and answer a
+selected suggestion without encoding or ranking anything.
+"""
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from scope_gate import normalize
+
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+
+def normalize_text(text: str) -> str:
+    """Lower-cases a text and collapses punctuation and whitespace to single spaces"""
+    return _NON_WORD.sub(" ", text.lower()).lstrip()
+
+
+class PrefixTrie:
+    """
+    Maps word prefixes to rows. Every node lists the rows of all the words below it, in
+    the order the rows were inserted, so that inserting rows best first keeps every
+    node's list ranked.
+    """
+
+    def __init__(self):
+        # A node is [children by character, rows]
+        self.root = [{}, []]
+
+    def insert(self, word: str, row: int):
+        node = self.root
+        for char in word:
+            node = node[0].setdefault(char, [{}, []])
+            # All words of a row are inserted one after the other
+            if not node[1] or node[1][-1] != row:
+                node[1].append(row)
+
+    def rows(self, prefix: str) -> Sequence[int]:
+        """Rows with a word starting with prefix, in insertion order"""
+        node = self.root
+        for char in prefix:
+            node = node[0].get(char)
+            if node is None:
+                return ()
+        return node[1]
+
+
+class QuestionBank:
+    """
+    Args:
+        questions (List[Dict]): One dict per question with at least corpus, question_id,
+            chapter_no, verse_no and question; other keys (e.g. verse details) are kept
+        embeddings (np.ndarray): (questions, dim) embedding of each question
+        neighbours (int): Nearest questions kept per question, within its corpus
+    """
+
+    def __init__(self, questions: List[Dict], embeddings: np.ndarray, neighbours: int = 20):
+        self.questions = questions
+        self.embeddings = normalize(embeddings)
+        self.texts = [normalize_text(q["question"]).rstrip() for q in questions]
+        self.words = [set(text.split()) for text in self.texts]
+        self.rows_by_key = {(q["corpus"], q["question_id"]): row for row, q in enumerate(questions)}
+
+        # Nearest questions of the same corpus, as (row, cosine distance) closest first
+        self.neighbours: List[List[Tuple[int, float]]] = [[] for _ in questions]
+        corpora = np.array([q["corpus"] for q in questions])
+        self.corpus_sizes = {str(corpus): int(count) for corpus, count in zip(*np.unique(corpora, return_counts=True))}
+        for corpus in np.unique(corpora):
+            rows = np.flatnonzero(corpora == corpus)
+            distances = 1.0 - self.embeddings[rows] @ self.embeddings[rows].T
+            np.fill_diagonal(distances, np.inf)
+            for i, row in enumerate(rows):
+                nearest = np.argsort(distances[i], kind="stable")[:min(neighbours, len(rows) - 1)]
+                self.neighbours[row] = [(int(rows[j]), float(distances[i, j])) for j in nearest]
+
+        in_degree = np.zeros(len(questions), dtype=np.int64)
+        for neighbour_list in self.neighbours:
+            for row, _ in neighbour_list:
+                in_degree[row] += 1
+        ranked = sorted(range(len(questions)), key=lambda row: (-in_degree[row], len(self.texts[row]), row))
+
+        self.trie = PrefixTrie()
+        for row in ranked:
+            for word in sorted(self.words[row]):
+                self.trie.insert(word, row)
+
+    def __len__(self):
+        return len(self.questions)
+
+    def lookup(self, corpus: str, question_id: int) -> Optional[int]:
+        """Row of a question, or None when it is not in the bank"""
+        return self.rows_by_key.get((corpus, question_id))
+
+    def suggest(self, text: str, corpus: Optional[str] = None, limit: int = 8) -> List[Dict]:
+        """
+        Questions matching a partially typed query, best first. A question matches when
+        it contains every completed word of the text and a word starting with the last,
+        unfinished one; questions starting with the text come first. Short lists are
+        filled up with the neighbours of the matches.
+
+        Returns:
+            List[Dict]: corpus, question_id, question, chapter_no, verse_no and match
+                ("text" or "related") of each suggestion
+        """
+        typed = normalize_text(text)
+        tokens = typed.split()
+        if not tokens:
+            return []
+        finished = typed.endswith(" ")
+        complete = tokens if finished else tokens[:-1]
+        # The last token, finished or not, picks the candidates, already in rank order
+        candidates = self.trie.rows(tokens[-1])
+        typed = typed.rstrip()
+
+        leading, others = [], []
+        for row in candidates:
+            if corpus and self.questions[row]["corpus"] != corpus:
+                continue
+            if finished and tokens[-1] not in self.words[row]:
+                continue
+            if not all(word in self.words[row] for word in complete):
+                continue
+            if self.texts[row].startswith(typed):
+                leading.append(row)
+                if len(leading) == limit:
+                    break
+            elif len(others) < limit:
+                others.append(row)
+        matches = (leading + others)[:limit]
+
+        related = []
+        seen = set(matches)
+        for row in matches:
+            if len(matches) + len(related) >= limit:
+                break
+            for neighbour, _ in self.neighbours[row]:
+                if neighbour not in seen:
+                    seen.add(neighbour)
+                    related.append(neighbour)
+                    if len(matches) + len(related) >= limit:
+                        break
+
+        return [self._suggestion(row, "text") for row in matches] + [self._suggestion(row, "related") for row in related]
+
+    def _suggestion(self, row: int, match: str) -> Dict:
+        question = self.questions[row]
+        return {
+            "corpus": question["corpus"],
+            "question_id": question["question_id"],
+            "question": question["question"],
+            "chapter_no": question["chapter_no"],
+            "verse_no": question["verse_no"],
+            "match": match
+        }
+
+    def related_verses(self, row: int, limit: int,
+                       chapter_range: Optional[Tuple[int, int]] = None) -> Optional[List[Tuple[int, float]]]:
+        """
+        The answer to a selected question: the distinct verses of the question and of its
+        neighbours, each with its closest question, ordered by (distance, chapter_no,
+        verse_no) as a search with the question's own embedding over the question source
+        ranks them.
+
+        Returns:
+            Optional[List[Tuple[int, float]]]: (row of the matched question, cosine distance)
+                of up to limit verses, or None when the neighbour list cannot tell the first
+                limit verses apart from questions outside it, and a full search is needed
+        """
+        candidates = [(row, 0.0)] + self.neighbours[row]
+        closest = {}
+        for candidate, distance in candidates:
+            question = self.questions[candidate]
+            verse = (question["chapter_no"], question["verse_no"])
+            if chapter_range and not chapter_range[0] <= verse[0] <= chapter_range[1]:
+                continue
+            if verse not in closest:
+                closest[verse] = (distance, verse, candidate)
+        answers = sorted(closest.values())[:limit]
+
+        # Questions outside the list are at least as far as its last entry
+        covers_corpus = len(self.neighbours[row]) == self.corpus_sizes[self.questions[row]["corpus"]] - 1
+        if not covers_corpus and (len(answers) < limit or answers[-1][0] >= candidates[-1][1]):
+            return None
+        return [(candidate, distance) for distance, _, candidate in answers]
@@ -0,0 +1,67 @@
+# Benchmarks filtered vs unfiltered search latency against the configured database.
+# Questions are encoded once up front, so only the search itself is timed.
+# Run from the repository root: python testing/benchmark_filters.py
+
+import os
+import sys
+import time
+import pandas as pd
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app import encode_query, search_across_embeddings, search_pys_questions
+
+# (label, keyword arguments for search_across_embeddings)
+GITA_FILTERS = [
+    ("unfiltered", {}),
+    ("broad: chapters 1-18", {"chapter_range": (1, 18)}),
+    ("broad: Lord Krishna", {"speaker_name": "Lord Krishna"}),
+    ("selective: chapter 2", {"chapter_range": (2, 2)}),
+    ("selective: Arjun", {"speaker_name": "Arjun"}),
+    ("selective: chapter 1 + Sanjay", {"chapter_range": (1, 1), "speaker_name": "Sanjay"}),
+]
+
+PYS_FILTERS = [
+    ("unfiltered", {}),
+    ("broad: padas 1-4", {"chapter_range": (1, 4)}),
+    ("selective: pada 2", {"chapter_range": (2, 2)}),
+]
+
+def time_queries(search_fn, questions, vectors, kwargs):
+    """
+    Runs every question through search_fn with its precomputed query vector and returns
+    per-query latencies in milliseconds.
+    """
+    latencies = []
+    for question, vector in zip(questions, vectors):
+        start = time.perf_counter()
+        search_fn(question, query_vector=vector, **kwargs)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return np.array(latencies)
+
+def report(label, latencies):
+    print(f"{label:<32} p50={np.percentile(latencies, 50):7.2f}ms  "
+          f"p95={np.percentile(latencies, 95):7.2f}ms  mean={latencies.mean():7.2f}ms")
+
+def main(sample_size=100):
+    gita_questions = pd.read_csv("testing/test_file.csv")["question"].head(sample_size).tolist()
+    pys_questions = pd.read_csv(
+        "data/Patanjali_Yoga_Sutras_Verses_English_Questions.csv"
+    )["question"].head(sample_size).tolist()
+
+    gita_vectors = [encode_query(q) for q in gita_questions]
+    pys_vectors = [encode_query(q) for q in pys_questions]
+    # Warm up the connection pool
+    search_across_embeddings(gita_questions[0], limit=1, query_vector=gita_vectors[0])
+
+    print(f"\nGita search ({len(gita_questions)} queries, limit=1):")
+    for label, kwargs in GITA_FILTERS:
+        report(label, time_queries(search_across_embeddings, gita_questions, gita_vectors, {"limit": 1, **kwargs}))
+
+    print(f"\nYoga Sutras search ({len(pys_questions)} queries, limit=5):")
+    for label, kwargs in PYS_FILTERS:
+        report(label, time_queries(search_pys_questions, pys_questions, pys_vectors, {"limit": 5, **kwargs}))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# Recall and latency of chapter-routed search against exhaustive search, on a corpus scaled
+# up synthetically: every Gita question, translation and commentary embedding from the
+# embedded bundle (data/scripts/build_bundle.py) is copied --scale times with random jitter,
+# keeping its chapter.
+# Run from the repository root: python testing/chapter_routing_benchmark.py --scale 50
+
+import argparse
+import os
+import sys
+import time
+import pandas as pd
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from chapter_router import ChapterRouter
+from schema import GITA_CORPUS
+from storage import EmbeddedStorage, VectorIndex
+
+model = SentenceTransformer('all-MiniLM-L6-v2')
+
+def scale_index(index, scale, noise, rng):
+    """Copies every row of a VectorIndex scale times with Gaussian jitter"""
+    rows = np.repeat(np.arange(len(index)), scale)
+    embeddings = index.matrix[rows] + rng.normal(0, noise, size=(len(rows), index.matrix.shape[1])).astype(np.float32)
+    return VectorIndex(np.arange(len(rows)), index.chapters[rows], index.verses[rows], embeddings)
+
+def search(indexes, query_vector, limit, chapters=None):
+    """Top rows over all sources, as (source, row) pairs best first"""
+    results = []
+    for name, index in indexes.items():
+        rows, distances = index.top(query_vector, limit, chapters=chapters)
+        results.extend((distance, name, row) for row, distance in zip(rows, distances))
+    results.sort()
+    return [(name, row) for _, name, row in results[:limit]]
+
+def main(bundle, scale, noise, limit, top_ns):
+    storage = EmbeddedStorage(bundle)
+    rng = np.random.default_rng(0)
+    indexes = {
+        source.name: scale_index(storage.indexes[(GITA_CORPUS.name, source.name)], scale, noise, rng)
+        for source in GITA_CORPUS.sources
+    }
+    print(f"Scaled corpus: {sum(len(i) for i in indexes.values())} vectors "
+          f"({', '.join(f'{name} {len(i)}' for name, i in indexes.items())})")
+
+    intros = storage.gita_chapters()
+    router = ChapterRouter.from_embeddings(
+        [indexes[name].chapters for name in ("translation", "commentary")],
+        [indexes[name].matrix for name in ("translation", "commentary")],
+        intro_chapters=np.array([row["chapter_no"] for row in intros]),
+        intro_embeddings=model.encode([row["chapter_intro"] or "" for row in intros])
+    )
+
+    questions = pd.read_csv("testing/test_file.csv")["question"].dropna().tolist()
+    print(f"Encoding {len(questions)} queries...")
+    query_vectors = model.encode(questions)
+
+    exhaustive, exhaustive_ms = [], []
+    for vector in query_vectors:
+        start = time.perf_counter()
+        exhaustive.append(search(indexes, vector, limit))
+        exhaustive_ms.append((time.perf_counter() - start) * 1000)
+
+    print(f"\nrecall@{limit} and top-1 agreement against exhaustive search, latencies in ms")
+    print(f"{'N':>4}{'recall':>10}{'top-1':>10}{'p50':>10}{'p95':>10}{'speedup':>10}")
+    print(f"{'all':>4}{1:>10.1%}{1:>10.1%}{np.percentile(exhaustive_ms, 50):>10.2f}"
+          f"{np.percentile(exhaustive_ms, 95):>10.2f}{1:>9.1f}x")
+    for n in top_ns:
+        recalls, top1, latencies = [], [], []
+        for vector, expected in zip(query_vectors, exhaustive):
+            start = time.perf_counter()
+            routed = search(indexes, vector, limit, chapters=router.top_chapters(vector, n))
+            latencies.append((time.perf_counter() - start) * 1000)
+            recalls.append(len(set(routed) & set(expected)) / len(expected))
+            top1.append(routed[:1] == expected[:1])
+        print(f"{n:>4}{np.mean(recalls):>10.1%}{np.mean(top1):>10.1%}{np.percentile(latencies, 50):>10.2f}"
+              f"{np.percentile(latencies, 95):>10.2f}"
+              f"{np.percentile(exhaustive_ms, 50) / np.percentile(latencies, 50):>9.1f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Chapter-routed vs exhaustive search on a scaled corpus")
+    parser.add_argument("--bundle", default="data/processed/texts.sqlite")
+    parser.add_argument("--scale", type=int, default=50, help="Copies of every embedding")
+    parser.add_argument("--noise", type=float, default=0.02, help="Standard deviation of the jitter per dimension")
+    parser.add_argument("--limit", type=int, default=5)
+    parser.add_argument("--top-n", type=int, nargs="+", default=[1, 2, 3, 5, 8])
+    args = parser.parse_args()
+    main(args.bundle, args.scale, args.noise, args.limit, args.top_n)
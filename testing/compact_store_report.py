@@ -0,0 +1,70 @@
+# Memory, latency and top-1 agreement of the float16 and int8 embedding stores against the
+# float32 baseline, ranking the Bhagavad Gita with every question of both question CSVs.
+# Needs the bundle built by data/scripts/build_bundle.py.
+# Run from the repository root: python testing/compact_store_report.py
+
+import argparse
+import os
+import sys
+import time
+import pandas as pd
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from schema import GITA_CORPUS
+from storage import EmbeddedStorage
+
+model = SentenceTransformer('all-MiniLM-L6-v2')
+
+QUESTION_CSVS = [
+    "data/Bhagwad_Gita_Verses_English_Questions.csv",
+    "data/Patanjali_Yoga_Sutras_Verses_English_Questions.csv",
+]
+
+def gita_nbytes(storage):
+    return sum(storage.indexes[(GITA_CORPUS.name, source.name)].nbytes() for source in GITA_CORPUS.sources)
+
+def run(storage, query_vectors, limit):
+    """Top-1 verse and latency in ms of every query"""
+    top1, latencies = [], []
+    for vector in query_vectors:
+        start = time.perf_counter()
+        results = storage.rank(GITA_CORPUS, vector, limit)
+        latencies.append((time.perf_counter() - start) * 1000)
+        top1.append(results[0][:2] if results else None)
+    return top1, np.array(latencies)
+
+def main(bundle, limit, rescore_factors):
+    questions = []
+    for path in QUESTION_CSVS:
+        questions += pd.read_csv(path)["question"].dropna().tolist()
+    print(f"Encoding {len(questions)} questions...")
+    query_vectors = model.encode(questions)
+
+    baseline = EmbeddedStorage(bundle)
+    baseline_top1, baseline_ms = run(baseline, query_vectors, limit)
+    baseline_bytes = gita_nbytes(baseline)
+
+    print(f"\nGita embeddings in memory, rank() with limit {limit}, latencies in ms")
+    print(f"{'store':<22}{'memory':>12}{'vs f32':>8}{'p50':>8}{'p95':>8}{'top-1 agree':>13}")
+    print(f"{'float32':<22}{baseline_bytes / 1024:>10.0f}KB{1:>8.0%}"
+          f"{np.percentile(baseline_ms, 50):>8.2f}{np.percentile(baseline_ms, 95):>8.2f}{1:>13.1%}")
+    for precision in ("float16", "int8"):
+        for rescore_factor in rescore_factors:
+            storage = EmbeddedStorage(bundle, precision, rescore_factor)
+            top1, latencies = run(storage, query_vectors, limit)
+            agreement = np.mean([a == b for a, b in zip(top1, baseline_top1)])
+            label = f"{precision} rescore x{rescore_factor}" if rescore_factor else f"{precision} no rescore"
+            nbytes = gita_nbytes(storage)
+            print(f"{label:<22}{nbytes / 1024:>10.0f}KB{nbytes / baseline_bytes:>8.0%}"
+                  f"{np.percentile(latencies, 50):>8.2f}{np.percentile(latencies, 95):>8.2f}{agreement:>13.1%}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compact embedding store vs float32")
+    parser.add_argument("--bundle", default="data/processed/texts.sqlite")
+    parser.add_argument("--limit", type=int, default=5)
+    parser.add_argument("--rescore-factors", type=int, nargs="+", default=[0, 2, 4])
+    args = parser.parse_args()
+    main(args.bundle, args.limit, args.rescore_factors)
@@ -0,0 +1,166 @@
+# Checks the embedded storage backend against a brute-force NumPy reference computed
+# straight from the bundle's embedding blobs, without Postgres or the model: rank() with
+# every filter, chapter routing and the quantized indexes, search_pys() with pagination,
+# and that an incomplete backend cannot be constructed. Queries are stored question
+# embeddings and random vectors. Exits non-zero on the first mismatch.
+# Needs the bundle built by data/scripts/build_bundle.py.
+# Run from the repository root: python testing/embedded_storage_check.py
+
+import argparse
+import os
+import sqlite3
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from schema import GITA_CORPUS, PYS_CORPUS
+from storage import EmbeddedStorage, SQLStorage
+
+TOLERANCE = 1e-5
+
+def load_source(connection, source):
+    """(chapters, verses, speakers, normalized embeddings) of one source, read directly"""
+    table = source.table.name
+    speaker = "lower(coalesce(info.speaker_name, ''))"
+    join = "" if table == "info" else " LEFT JOIN info USING (chapter_no, verse_no)"
+    rows = connection.execute(
+        f"SELECT {table}.chapter_no, {table}.verse_no, {speaker}, {table}.{source.embedding.name} "
+        f"FROM {table}{join}"
+    ).fetchall()
+    embeddings = np.vstack([np.frombuffer(r[3], dtype=np.float32) for r in rows])
+    embeddings = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+    return (np.array([r[0] for r in rows]), np.array([r[1] for r in rows]),
+            np.array([r[2] for r in rows], dtype=object), embeddings)
+
+def reference_rank(sources, query, limit, chapter_range=None, speaker_name=None, chapters=None):
+    query = query / np.linalg.norm(query)
+    results = []
+    for name, (chapter_nos, verse_nos, speakers, embeddings) in sources.items():
+        mask = np.ones(len(chapter_nos), dtype=bool)
+        if chapter_range:
+            mask &= (chapter_nos >= chapter_range[0]) & (chapter_nos <= chapter_range[1])
+        if speaker_name:
+            mask &= speakers == speaker_name.lower()
+        if chapters is not None:
+            mask &= np.isin(chapter_nos, chapters)
+        rows = np.flatnonzero(mask)
+        distances = 1.0 - embeddings[rows] @ query
+        for i in np.argsort(distances, kind="stable")[:limit]:
+            results.append((int(chapter_nos[rows[i]]), int(verse_nos[rows[i]]), float(distances[i]), name))
+    results.sort(key=lambda r: r[2])
+    return results
+
+def reference_search_pys(source, query, chapter_range=None):
+    """Every sutra with its best question distance, ordered like search_pys"""
+    chapter_nos, verse_nos, _, embeddings = source
+    distances = 1.0 - embeddings @ (query / np.linalg.norm(query))
+    best = {}
+    for c, v, d in zip(chapter_nos.tolist(), verse_nos.tolist(), distances.tolist()):
+        if chapter_range and not chapter_range[0] <= c <= chapter_range[1]:
+            continue
+        best[(c, v)] = min(d, best.get((c, v), np.inf))
+    return sorted((d, c, v) for (c, v), d in best.items())
+
+def check(condition, message):
+    if not condition:
+        raise SystemExit(f"FAIL: {message}")
+
+def same_ranking(actual, expected, label):
+    """
+    Distances must match. Within each source, verses may only differ among the rows tied
+    with that source's last (limit-th) distance, which either backend may pick.
+    """
+    check(len(actual) == len(expected), f"{label}: {len(actual)} results, expected {len(expected)}")
+    for a, e in zip(actual, expected):
+        check(abs(a[2] - e[2]) < TOLERANCE, f"{label}: distance {a[2]} != {e[2]}")
+    for name in {e[3] for e in expected} | {a[3] for a in actual}:
+        boundary = max([e[2] for e in expected if e[3] == name], default=0.0) - TOLERANCE
+        inside = lambda results: {r[:2] for r in results if r[3] == name and r[2] < boundary}
+        check(inside(actual) == inside(expected), f"{label}: different {name} verses")
+
+def check_abstract():
+    try:
+        SQLStorage(None)
+    except TypeError:
+        pass
+    else:
+        raise SystemExit("FAIL: SQLStorage can be constructed")
+
+    class Incomplete(SQLStorage):
+        def rank(self, *args, **kwargs):
+            return []
+    try:
+        Incomplete(None)
+    except TypeError:
+        return
+    raise SystemExit("FAIL: a backend without search_pys can be constructed")
+
+def main(bundle, samples, limit):
+    check_abstract()
+    connection = sqlite3.connect(bundle)
+    gita = {source.name: load_source(connection, source) for source in GITA_CORPUS.sources}
+    pys = load_source(connection, PYS_CORPUS.sources[0])
+
+    rng = np.random.default_rng(0)
+    questions = gita["question"][3]
+    queries = list(questions[rng.choice(len(questions), samples // 2, replace=False)])
+    queries += list(rng.normal(size=(samples - len(queries), questions.shape[1])).astype(np.float32))
+
+    storage = EmbeddedStorage(bundle)
+    filters = [
+        {},
+        {"chapter_range": (2, 4)},
+        {"speaker_name": "Arjun"},
+        {"chapter_range": (1, 1), "speaker_name": "Sanjay"},
+        {"chapters": [2, 3, 18]},
+        {"chapter_range": (2, 6), "chapters": [3, 12]},
+    ]
+    for kwargs in filters:
+        for query in queries:
+            same_ranking(storage.rank(GITA_CORPUS, query, limit, **kwargs),
+                         reference_rank(gita, query, limit, **kwargs), f"rank {kwargs}")
+    print(f"rank: {len(filters)} filter sets x {len(queries)} queries match the reference")
+
+    for precision in ("float16", "int8"):
+        quantized = EmbeddedStorage(bundle, precision, rescore_factor=4)
+        agree = 0
+        for query in queries:
+            results = quantized.rank(GITA_CORPUS, query, limit)
+            expected = reference_rank(gita, query, limit)
+            agree += results[:1] == expected[:1] or abs(results[0][2] - expected[0][2]) < TOLERANCE
+            # Rescored distances are exact, whichever rows were picked
+            for chapter_no, verse_no, distance, name in results:
+                chapter_nos, verse_nos, _, embeddings = gita[name]
+                row = np.flatnonzero((chapter_nos == chapter_no) & (verse_nos == verse_no))
+                exact = 1.0 - embeddings[row] @ (query / np.linalg.norm(query))
+                check(np.min(np.abs(exact - distance)) < TOLERANCE, f"{precision}: inexact distance")
+        print(f"rank {precision}: top-1 agrees on {agree}/{len(queries)}, distances exact")
+        check(agree >= 0.9 * len(queries), f"{precision}: top-1 agreement below 90%")
+
+    for chapter_range in (None, (2, 3)):
+        for query in queries:
+            expected = reference_search_pys(pys, query, chapter_range)
+            pages, after = [], None
+            while len(pages) < 3 * limit:
+                page = storage.search_pys(query, limit, chapter_range, after)
+                pages += page
+                if len(page) < limit:
+                    break
+                after = (page[-1]["similarity_score"], page[-1]["chapter_no"], page[-1]["verse_no"])
+            check(len(pages) == min(len(pages), len(expected)), "search_pys: too many sutras")
+            for sutra, (distance, chapter_no, verse_no) in zip(pages, expected):
+                check(abs(sutra["similarity_score"] - distance) < TOLERANCE,
+                      f"search_pys {chapter_range}: distance {sutra['similarity_score']} != {distance}")
+            check(len({(s["chapter_no"], s["verse_no"]) for s in pages}) == len(pages),
+                  "search_pys: a sutra appears on two pages")
+    print(f"search_pys: 3 pages x {len(queries)} queries match the reference, with and without a chapter range")
+    print("OK")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embedded backend against a brute-force reference")
+    parser.add_argument("--bundle", default="data/processed/texts.sqlite")
+    parser.add_argument("--samples", type=int, default=40)
+    parser.add_argument("--limit", type=int, default=5)
+    args = parser.parse_args()
+    main(args.bundle, args.samples, args.limit)
@@ -0,0 +1,125 @@
+# A local stand-in for the Mistral chat completions API, for load and failure testing.
+# Start it with: python testing/fake_mistral.py --port 8089 --delay 1.5 --failure-rate 0.1
+# and point the app at it with MISTRAL_SERVER_URL=http://localhost:8089
+
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeMistralHandler(BaseHTTPRequestHandler):
+    """Answers POST /v1/chat/completions after a delay; GET /stats reports request counts"""
+
+    def do_POST(self):
+        if self.path != "/v1/chat/completions":
+            self.send_error(404)
+            return
+
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+
+        try:
+            time.sleep(server.delay * random.uniform(0.5, 1.5))
+            if random.random() < server.failure_rate:
+                self.send_error(503, "Service unavailable")
+                return
+            if server.throttle_above and server.in_flight > server.throttle_above:
+                self.send_error(429, "Too many requests")
+                return
+
+            prompt = body["messages"][-1]["content"]
+            self._send_json({
+                "id": f"fake-{server.requests}",
+                "object": "chat.completion",
+                "model": body.get("model", "fake"),
+                "created": int(time.time()),
+                "usage": {
+                    "prompt_tokens": len(prompt.split()),
+                    "completion_tokens": 40,
+                    "total_tokens": len(prompt.split()) + 40
+                },
+                "choices": [{
+                    "index": 0,
+                    "finish_reason": "stop",
+                    "message": {
+                        "role": "assistant",
+                        "content": f"Fake summary for a {len(prompt.split())} word prompt."
+                    }
+                }]
+            })
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def do_GET(self):
+        if self.path != "/stats":
+            self.send_error(404)
+            return
+        with self.server.lock:
+            self._send_json({
+                "requests": self.server.requests,
+                "in_flight": self.server.in_flight,
+                "max_in_flight": self.server.max_in_flight
+            })
+
+    def _send_json(self, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeMistralServer(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        # Clients that time out hang up before the response is written; that is expected here
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def start_fake_mistral(port=0, delay=1.0, failure_rate=0.0, throttle_above=0):
+    """
+    Starts the fake server on a background thread.
+
+    Returns:
+        FakeMistralServer: The running server; its URL is http://127.0.0.1:<server.server_port>
+    """
+    server = FakeMistralServer(("127.0.0.1", port), FakeMistralHandler)
+    server.delay = delay
+    server.failure_rate = failure_rate
+    server.throttle_above = throttle_above
+    server.lock = threading.Lock()
+    server.requests = 0
+    server.in_flight = 0
+    server.max_in_flight = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Mistral chat completions server")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--delay", type=float, default=1.0, help="Mean response time in seconds")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of requests answered with 503")
+    parser.add_argument("--throttle-above", type=int, default=0,
+                        help="Answer 429 when more than this many requests are in flight (0 disables)")
+    args = parser.parse_args()
+
+    server = start_fake_mistral(args.port, args.delay, args.failure_rate, args.throttle_above)
+    print(f"Fake Mistral listening on http://127.0.0.1:{server.server_port}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,80 @@
+# Drives the LLM gateway with a burst of concurrent summary requests against the fake
+# Mistral server and reports coalescing, shedding, fallbacks and the concurrency the
+# upstream saw. Run from the repository root, e.g. to watch the breaker open:
+# python testing/llm_gateway_load.py --delay 2 --failure-rate 0.5 --budget-ms 1500
+
+import argparse
+import os
+import sys
+import time
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+from mistralai import Mistral
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from llm_gateway import LLMGateway, call_timeout_ms, normalize_query
+from fake_mistral import start_fake_mistral
+
+QUESTIONS = [
+    "What is karma yoga?",
+    "what is  karma yoga",
+    "How can I achieve peace of mind?",
+    "Why should I do my duty without attachment?",
+    "What happens to the soul after death?",
+]
+
+def main(requests=200, burst_threads=64, delay=0.5, failure_rate=0.0, budget_ms=6000, min_timeout_ms=1000):
+    server = start_fake_mistral(delay=delay, failure_rate=failure_rate)
+    client = Mistral(api_key="fake", server_url=f"http://127.0.0.1:{server.server_port}")
+    gateway = LLMGateway(max_in_flight=4, max_queue=16, queue_timeout=2.0)
+
+    def summarize(question, verse, deadline):
+        response = client.chat.complete(
+            model="fake",
+            messages=[{"role": "user", "content": f"Verse {verse}: {question}"}],
+            timeout_ms=call_timeout_ms(deadline, min_timeout_ms)
+        )
+        return response.choices[0].message.content
+
+    def one_request(_):
+        question = random.choice(QUESTIONS)
+        verse = random.randint(1, 3)
+        start = time.perf_counter()
+        deadline = time.monotonic() + budget_ms / 1000
+        try:
+            gateway.run((2, verse, normalize_query(question)),
+                        lambda: summarize(question, verse, deadline), deadline=deadline)
+            outcome = "summary"
+        except Exception:
+            # The app answers these with the extractive summary
+            outcome = "fallback"
+        return outcome, time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=burst_threads) as executor:
+        outcomes = list(executor.map(one_request, range(requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for _, latency in outcomes)
+    print(f"{requests} requests in {elapsed:.2f}s with {burst_threads} concurrent clients")
+    print(f"summaries: {sum(1 for o, _ in outcomes if o == 'summary')}, "
+          f"fallbacks: {sum(1 for o, _ in outcomes if o == 'fallback')}")
+    print(f"client latency p50={latencies[len(latencies) // 2] * 1000:.0f}ms "
+          f"p95={latencies[int(len(latencies) * 0.95)] * 1000:.0f}ms "
+          f"p99={latencies[int(len(latencies) * 0.99)] * 1000:.0f}ms (budget {budget_ms}ms)")
+    print(f"upstream requests: {server.requests}, upstream max in flight: {server.max_in_flight}")
+    print("gateway stats:", gateway.stats())
+    server.shutdown()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test of the LLM gateway against the fake Mistral server")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--delay", type=float, default=0.5, help="Mean fake Mistral response time in seconds")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--budget-ms", type=int, default=6000, help="Latency budget of each summary")
+    parser.add_argument("--min-timeout-ms", type=int, default=1000, help="Shortest Mistral timeout tried")
+    args = parser.parse_args()
+    main(args.requests, args.clients, args.delay, args.failure_rate, args.budget_ms, args.min_timeout_ms)
@@ -0,0 +1,56 @@
+# Measures the summary prompt size before and after token budgeting, using every question
+# in the Bhagavad Gita question CSV against the commentary of its verse.
+# Run from the repository root: python testing/prompt_tokens.py --max-input-tokens 700
+
+import argparse
+import os
+import sys
+import pandas as pd
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from prompt_builder import PROMPT_VERSION, build_prompt, split_passages
+
+model = SentenceTransformer('all-MiniLM-L6-v2')
+
+def count_tokens(text):
+    return len(model.tokenizer.tokenize(text))
+
+def main(max_input_tokens):
+    questions = pd.read_csv("data/Bhagwad_Gita_Verses_English_Questions.csv")[["chapter", "verse", "question"]]
+    verses = pd.read_csv("data/processed/temp.csv")[["chapter", "verse", "translation", "commentary"]]
+    rows = questions.dropna(subset=["question"]).merge(verses, on=["chapter", "verse"]).fillna("")
+
+    print(f"Encoding {len(rows)} questions...")
+    query_embeddings = model.encode(rows["question"].tolist(), show_progress_bar=True)
+    passage_cache = {}
+
+    def encode_passages(commentary):
+        if commentary not in passage_cache:
+            passages = split_passages(commentary)
+            passage_cache[commentary] = (passages, model.encode(passages))
+        return passage_cache[commentary]
+
+    before, after = [], []
+    for row, query_embedding in zip(rows.itertuples(), query_embeddings):
+        _, stats = build_prompt(row.question, row.translation, row.commentary, query_embedding,
+                                encode_passages, count_tokens, max_input_tokens)
+        before.append(stats["tokens_before"])
+        after.append(stats["tokens_after"])
+
+    before, after = np.array(before), np.array(after)
+    print(f"\nPrompt {PROMPT_VERSION}, input budget {max_input_tokens} tokens, {len(before)} requests")
+    print(f"{'':<8}{'mean':>8}{'p50':>8}{'p95':>8}{'max':>8}{'total':>10}")
+    for label, tokens in (("before", before), ("after", after)):
+        print(f"{label:<8}{tokens.mean():>8.0f}{np.percentile(tokens, 50):>8.0f}"
+              f"{np.percentile(tokens, 95):>8.0f}{tokens.max():>8}{tokens.sum():>10}")
+    print(f"Compressed prompts: {(after < before).mean():.1%}, "
+          f"tokens saved: {1 - after.sum() / before.sum():.1%}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prompt token usage before and after budgeting")
+    parser.add_argument("--max-input-tokens", type=int, default=700)
+    args = parser.parse_args()
+    main(args.max_input_tokens)
@@ -0,0 +1,103 @@
+# Compares the scope gate with the full search path on held-out Gita questions and a set
+# of off-topic queries: how often the gate fires, how often it disagrees with the full
+# path, and the search time it saves. The gate is refitted with the settings of
+# data/scripts/calibrate_scope_gate.py, once per fold with that fold's questions left out,
+# so no in-scope query was seen when fitting. The full path still finds a held-out
+# question's own row, so any rejection of one counts as false.
+# Run from the repository root: python testing/scope_gate_report.py
+
+import argparse
+import os
+import sys
+import time
+import pandas as pd
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app import encode_query, get_best_match_with_details, storage
+from schema import GITA_CORPUS
+from scope_gate import ScopeGate, normalize
+
+# Typical bot and off-topic traffic
+OFF_TOPIC_QUERIES = [
+    "What's the weather in Paris tomorrow?",
+    "Best pizza near me",
+    "How do I reset my router password?",
+    "Convert 50 USD to EUR",
+    "Who won the football world cup in 2018?",
+    "python list comprehension example",
+    "cheap flights to new york",
+    "How many calories are in a banana?",
+    "Write me a poem about cats",
+    "What is the capital of Australia?",
+    "iphone 15 price",
+    "How to fix a flat bicycle tyre",
+    "SELECT * FROM users",
+    "asdfghjkl",
+    "buy bitcoin now",
+    "What time does the supermarket close?",
+    "Translate hello into Spanish",
+    "Symptoms of the flu",
+    "How to bake sourdough bread",
+    "Stock price of Tesla",
+]
+
+def gita_embeddings():
+    """Question embeddings and the embeddings of the other Gita sources, without empty texts"""
+    questions, others = None, []
+    for source in GITA_CORPUS.sources:
+        vectors = storage.source_embeddings(source)[1]
+        vectors = normalize(vectors[np.linalg.norm(vectors, axis=1) > 0])
+        if source.name == "question":
+            questions = vectors
+        else:
+            others.append(vectors)
+    return questions, np.vstack(others)
+
+def compare(gate, query_vector):
+    start = time.perf_counter()
+    gate_rejects = not gate.in_scope(query_vector, ["gita"])
+    gate_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    result = get_best_match_with_details("", query_vector=query_vector)
+    full_ms = (time.perf_counter() - start) * 1000
+    full_rejects = not result or result.get("is_irrelevant", False)
+    return gate_rejects, full_rejects, gate_ms, full_ms
+
+def main(k, quantile, margin, folds):
+    questions, others = gita_embeddings()
+    rows = []
+    order = np.random.default_rng(0).permutation(len(questions))
+    for fold in np.array_split(order, folds):
+        training = np.vstack([np.delete(questions, fold, axis=0), others])
+        gate = ScopeGate.fit({"gita": training}, k, quantile, margin)
+        rows += [("held out", *compare(gate, questions[i])) for i in fold]
+
+    gate = ScopeGate.fit({"gita": np.vstack([questions, others])}, k, quantile, margin)
+    rows += [("off topic", *compare(gate, encode_query(query))) for query in OFF_TOPIC_QUERIES]
+
+    df = pd.DataFrame(rows, columns=["label", "gate_rejects", "full_rejects", "gate_ms", "full_ms"])
+    print(f"k={k}, quantile={quantile}, margin={margin}, {folds} folds; "
+          f"threshold on all data {gate.thresholds['gita']:.3f}\n")
+    print(f"{'':<12}{'queries':>8}{'gate fires':>12}{'full rejects':>14}{'false rej.':>12}{'missed':>8}")
+    for label, group in df.groupby("label"):
+        false_rejections = (group.gate_rejects & ~group.full_rejects).sum()
+        missed = (~group.gate_rejects & group.full_rejects).sum()
+        print(f"{label:<12}{len(group):>8}{group.gate_rejects.mean():>12.1%}{group.full_rejects.mean():>14.1%}"
+              f"{false_rejections:>12}{missed:>8}")
+
+    print(f"\nGate latency p50 {np.percentile(df.gate_ms, 50):.3f} ms, "
+          f"full path p50 {np.percentile(df.full_ms, 50):.1f} ms")
+    print(f"Full-path time avoided on gated queries: {df.full_ms[df.gate_rejects].sum():.0f} ms "
+          f"of {df.full_ms.sum():.0f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scope gate against the full search path")
+    parser.add_argument("--k", type=int, default=32)
+    parser.add_argument("--quantile", type=float, default=1.0)
+    parser.add_argument("--margin", type=float, default=0.05)
+    parser.add_argument("--folds", type=int, default=5)
+    args = parser.parse_args()
+    main(args.k, args.quantile, args.margin, args.folds)
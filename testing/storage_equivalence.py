@@ -0,0 +1,99 @@
+# Checks that the embedded storage backend returns the same verses as Postgres and compares
+# their search latency. Needs DATABASE_URL and a bundle built by data/scripts/build_bundle.py
+# from the same data.
+# Run from the repository root: python testing/storage_equivalence.py --bundle data/processed/texts.sqlite
+
+import argparse
+import os
+import sys
+import time
+import pandas as pd
+import numpy as np
+from dotenv import load_dotenv
+from sentence_transformers import SentenceTransformer
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from schema import GITA_CORPUS, PYS_CORPUS
+from storage import EmbeddedStorage, PostgresStorage
+
+model = SentenceTransformer('all-MiniLM-L6-v2')
+
+# (label, keyword arguments for rank)
+GITA_FILTERS = [
+    ("unfiltered", {}),
+    ("chapter 2", {"chapter_range": (2, 2)}),
+    ("Arjun", {"speaker_name": "Arjun"}),
+]
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, (time.perf_counter() - start) * 1000
+
+def compare(label, pairs, tolerance):
+    """
+    Prints top-1 and top-k agreement, the largest distance difference and the latency of
+    both backends. pairs holds (postgres_keys, postgres_distances, postgres_ms,
+    embedded_keys, embedded_distances, embedded_ms) per query.
+    """
+    top1 = np.mean([pg[:1] == em[:1] for pg, _, _, em, _, _ in pairs])
+    topk = np.mean([set(pg) == set(em) for pg, _, _, em, _, _ in pairs])
+    max_diff = max(
+        (max(abs(a - b) for a, b in zip(pg_d, em_d)) for _, pg_d, _, _, em_d, _ in pairs if pg_d and em_d),
+        default=0.0
+    )
+    pg_ms = np.array([p[2] for p in pairs])
+    em_ms = np.array([p[5] for p in pairs])
+    status = "OK" if top1 == 1 and max_diff <= tolerance else "MISMATCH"
+    print(f"{label:<24}{top1:>8.1%}{topk:>8.1%}{max_diff:>12.2e}"
+          f"{np.percentile(pg_ms, 50):>10.1f}{np.percentile(pg_ms, 95):>10.1f}"
+          f"{np.percentile(em_ms, 50):>10.1f}{np.percentile(em_ms, 95):>10.1f}  {status}")
+
+def main(bundle, limit, tolerance):
+    load_dotenv()
+    postgres = PostgresStorage(os.getenv("DATABASE_URL"))
+    embedded = EmbeddedStorage(bundle)
+
+    gita_questions = pd.read_csv("testing/test_file.csv")["question"].dropna().tolist()
+    pys_questions = pd.read_csv("data/Patanjali_Yoga_Sutras_Verses_English_Questions.csv")["question"].dropna().tolist()
+    print(f"Encoding {len(gita_questions)} Gita and {len(pys_questions)} Yoga Sutras questions...")
+    gita_vectors = model.encode(gita_questions)
+    pys_vectors = model.encode(pys_questions)
+
+    print(f"\ntop-{limit}, distance tolerance {tolerance:g}, latencies in ms")
+    print(f"{'':<24}{'top-1':>8}{'top-k':>8}{'max diff':>12}"
+          f"{'pg p50':>10}{'pg p95':>10}{'emb p50':>10}{'emb p95':>10}")
+
+    for label, kwargs in GITA_FILTERS:
+        pairs = []
+        for vector in gita_vectors:
+            pg, pg_ms = timed(postgres.rank, GITA_CORPUS, vector, limit, **kwargs)
+            em, em_ms = timed(embedded.rank, GITA_CORPUS, vector, limit, **kwargs)
+            pairs.append(([r[:2] for r in pg], [r[2] for r in pg], pg_ms,
+                          [r[:2] for r in em], [r[2] for r in em], em_ms))
+        compare(f"gita {label}", pairs, tolerance)
+
+    pairs = []
+    for vector in pys_vectors:
+        pg, pg_ms = timed(postgres.search_pys, vector, limit)
+        em, em_ms = timed(embedded.search_pys, vector, limit)
+        pairs.append(([(r["chapter_no"], r["verse_no"]) for r in pg], [r["similarity_score"] for r in pg], pg_ms,
+                      [(r["chapter_no"], r["verse_no"]) for r in em], [r["similarity_score"] for r in em], em_ms))
+    compare("pys distinct sutras", pairs, tolerance)
+
+    # Verse details must match field for field
+    details_match = all(
+        postgres.verse_details(corpus, chapter_no, verse_no) == embedded.verse_details(corpus, chapter_no, verse_no)
+        for corpus in (GITA_CORPUS, PYS_CORPUS)
+        for chapter_no, verse_no in ((1, 1), (2, 47), (4, 1))
+    )
+    print(f"\nVerse details identical: {details_match}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Postgres vs embedded storage equivalence and latency")
+    parser.add_argument("--bundle", default="data/processed/texts.sqlite")
+    parser.add_argument("--limit", type=int, default=5)
+    parser.add_argument("--tolerance", type=float, default=1e-4, help="Allowed cosine distance difference")
+    args = parser.parse_args()
+    main(args.bundle, args.limit, args.tolerance)
@@ -0,0 +1,164 @@
+# Checks the question suggestions. On a small synthetic bank: prefix and complete-word
+# matching, leading matches first, the corpus filter, neighbour fill-up and the answers
+# to a selected Yoga Sutras question against a brute-force reference. With --app, also
+# through the Flask test client against the configured storage: unknown question ids are
+# rejected, the cursor of a selected question continues its first page, and the filters
+# apply to selected questions of both corpora.
+# Run from the repository root: python testing/suggest_check.py [--app]
+
+import argparse
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from suggest import QuestionBank
+
+def check(condition, message):
+    if not condition:
+        raise SystemExit(f"FAIL: {message}")
+
+def synthetic_bank(neighbours):
+    texts = [
+        ("gita", 1, 1, "What is dharma?"),
+        ("gita", 2, 47, "What is my duty in action?"),
+        ("gita", 2, 48, "How do I act without attachment?"),
+        ("gita", 3, 8, "Why should I act at all?"),
+        ("gita", 6, 5, "How can the mind be its own friend?"),
+        ("pys", 1, 2, "What is yoga?"),
+        ("pys", 1, 2, "What does yoga restrain?"),
+        ("pys", 1, 12, "How is the mind stilled by practice?"),
+        ("pys", 2, 1, "What is the yoga of action?"),
+        ("pys", 2, 46, "How should a posture feel?"),
+        ("pys", 3, 1, "What is concentration?"),
+    ]
+    questions = [{"corpus": corpus, "question_id": i, "chapter_no": chapter_no, "verse_no": verse_no,
+                  "question": question} for i, (corpus, chapter_no, verse_no, question) in enumerate(texts)]
+    embeddings = np.random.default_rng(0).normal(size=(len(questions), 16)).astype(np.float32)
+    return QuestionBank(questions, embeddings, neighbours=neighbours)
+
+def texts(suggestions, match=None):
+    return [s["question"] for s in suggestions if match is None or s["match"] == match]
+
+def check_matching():
+    bank = synthetic_bank(neighbours=3)
+
+    found = texts(bank.suggest("wha", limit=20), "text")
+    check(len(found) == 6 and all(text.lower().startswith("what") for text in found), f"prefix: {found}")
+    # A finished word must be a whole word: "act " does not match "action"
+    found = texts(bank.suggest("act ", limit=20), "text")
+    check(sorted(found) == ["How do I act without attachment?", "Why should I act at all?"], f"complete word: {found}")
+    found = texts(bank.suggest("act", limit=20), "text")
+    check(len(found) == 4, f"unfinished word: {found}")
+    found = texts(bank.suggest("yoga wha", limit=20), "text")
+    check(len(found) == 3 and all("yoga" in text.lower() for text in found), f"words in any order: {found}")
+    found = texts(bank.suggest("what is", limit=20), "text")
+    leading = [text.lower().startswith("what is") for text in found]
+    check(leading == sorted(leading, reverse=True), f"leading matches first: {found}")
+    check(bank.suggest("  ?! ") == [], "empty text")
+    check(texts(bank.suggest("zzz")) == [], "no match, no neighbours")
+
+    for corpus in ("gita", "pys"):
+        found = bank.suggest("mind", corpus=corpus, limit=20)
+        check(found and all(s["corpus"] == corpus for s in found), f"corpus filter {corpus}: {found}")
+
+    found = bank.suggest("dharma", corpus="gita", limit=3)
+    check([s["match"] for s in found] == ["text", "related", "related"], f"fill-up: {found}")
+    match = bank.lookup("gita", found[0]["question_id"])
+    expected = [bank.questions[row]["question"] for row, _ in bank.neighbours[match][:2]]
+    check(texts(found, "related") == expected, f"fill-up order: {found}")
+    check(len({s["question_id"] for s in found}) == 3, "fill-up repeats a question")
+    print("suggest: prefix, complete-word, corpus filter and fill-up checks pass")
+
+def reference_related(bank, row, limit, chapter_range=None):
+    """Distinct verses of the question's corpus by their closest question, brute force"""
+    corpus = bank.questions[row]["corpus"]
+    distances = 1.0 - bank.embeddings @ bank.embeddings[row]
+    distances[row] = 0.0
+    closest = {}
+    for other, question in enumerate(bank.questions):
+        verse = (question["chapter_no"], question["verse_no"])
+        if question["corpus"] != corpus or chapter_range and not chapter_range[0] <= verse[0] <= chapter_range[1]:
+            continue
+        closest[verse] = min(closest.get(verse, np.inf), float(distances[other]))
+    return sorted((distance, verse) for verse, distance in closest.items())[:limit]
+
+def check_related():
+    rows = [row for row, q in enumerate(synthetic_bank(1).questions) if q["corpus"] == "pys"]
+    answered = 0
+    for neighbours in (1, 2, 3, 10):
+        bank = synthetic_bank(neighbours)
+        for row in rows:
+            for limit in (1, 2, 3, 6):
+                for chapter_range in (None, (1, 1), (2, 3)):
+                    answers = bank.related_verses(row, limit, chapter_range)
+                    if answers is None:
+                        continue
+                    answered += 1
+                    expected = reference_related(bank, row, limit, chapter_range)
+                    actual = [(distance, (bank.questions[r]["chapter_no"], bank.questions[r]["verse_no"]))
+                              for r, distance in answers]
+                    check(len(actual) == len(expected), f"related {row} {limit} {chapter_range}: {actual}")
+                    for (a, verse_a), (e, verse_e) in zip(actual, expected):
+                        check(abs(a - e) < 1e-5 and verse_a == verse_e,
+                              f"related {row} {limit} {chapter_range}: {actual} != {expected}")
+    # A neighbour list covering the corpus always answers, even with fewer than limit verses
+    bank = synthetic_bank(10)
+    check(all(bank.related_verses(row, 20) is not None for row in rows), "complete neighbour list")
+    check(synthetic_bank(1).related_verses(rows[0], 6) is None, "short neighbour list answered")
+    print(f"related_verses: {answered} answers match the reference, short lists defer to a search")
+
+def check_app():
+    import app as application
+    client = application.app.test_client()
+    bank = application.question_bank
+
+    for endpoint, corpus in (("/api/search", "gita"), ("/api/search_pys", "pys")):
+        response = client.post(endpoint, json={"question_id": 10 ** 9})
+        check(response.status_code == 400, f"{endpoint}: unknown question_id gave {response.status_code}")
+        others = [q["question_id"] for q in bank.questions if q["corpus"] != corpus
+                  and bank.lookup(corpus, q["question_id"]) is None]
+        if others:
+            response = client.post(endpoint, json={"question_id": others[0]})
+            check(response.status_code == 400, f"{endpoint}: question of another corpus gave {response.status_code}")
+        response = client.post(endpoint, json={"question_id": "1"})
+        check(response.status_code == 400, f"{endpoint}: string question_id gave {response.status_code}")
+
+    pys = [q for q in bank.questions if q["corpus"] == "pys"]
+    for question in pys[::max(1, len(pys) // 10)]:
+        for chapter_range in (None, [2, 3]):
+            payload = {"question_id": question["question_id"], "limit": 5}
+            if chapter_range:
+                payload["chapter_no"] = chapter_range
+            seen = []
+            for _ in range(3):
+                response = client.post("/api/search_pys", json=payload)
+                check(response.status_code == 200, f"search_pys: {response.get_json()}")
+                body = response.get_json()
+                seen += [(r["chapter_no"], r["verse_no"]) for r in body["results"]]
+                check(not chapter_range or all(2 <= c <= 3 for c, _ in seen), f"search_pys: chapter range {seen}")
+                if not body["next_cursor"]:
+                    break
+                payload["cursor"] = body["next_cursor"]
+            check(len(seen) == len(set(seen)), f"search_pys: a sutra appears on two pages {seen}")
+    print("search_pys: selected questions page on without repeats and keep their chapter range")
+
+    gita = [q for q in bank.questions if q["corpus"] == "gita"]
+    question = gita[0]
+    outside = [1, 1] if question["chapter_no"] != 1 else [2, 2]
+    body = client.post("/api/search", json={"question_id": question["question_id"], "chapter_no": outside}).get_json()
+    check(body.get("is_irrelevant") or outside[0] == body["chapter_no"], f"search: chapter range ignored {body}")
+    body = client.post("/api/search", json={"question_id": question["question_id"], "speaker_name": "Sanjay"}).get_json()
+    check(body.get("is_irrelevant") or body["speaker"].lower() == "sanjay", f"search: speaker ignored {body}")
+    print("search: selected questions keep their filters")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Question suggestions against expected behaviour")
+    parser.add_argument("--app", action="store_true", help="also check the endpoints with the configured storage")
+    args = parser.parse_args()
+    check_matching()
+    check_related()
+    if args.app:
+        check_app()
+    print("OK")
@@ -13,12 +13,14 @@ from sentence_transformers import SentenceTransformer
 load_dotenv()
 
 # Database connection
-DATABASE_URI = os.getenv("DATABASE_URI")
-if not DATABASE_URI:
-    raise ValueError("DATABASE_URI not set in .env file")
+DATABASE_URL = os.getenv("DATABASE_URL")
+if not DATABASE_URL:
+    raise ValueError("DATABASE_URL not set in .env file")
+if DATABASE_URL.startswith("postgres://"):
+    DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
 # Initialize SQLAlchemy engine and session
-engine = create_engine(DATABASE_URI)
+engine = create_engine(DATABASE_URL)
 Session = sessionmaker(bind=engine)
 session = Session()
 
@@ -0,0 +1,115 @@
+# Cost of sending the query vector to Postgres: the old path, where each of the three Gita
+# source queries carried the vector as a string literal twice (select and order by), against
+# one typed bind per statement read through a CTE.
+# Formatting and wire size are measured without a database; with DATABASE_URL set, the
+# server-side parse cost and the end-to-end rank latency are measured too. Random unit
+# vectors stand in for encoded queries, so the model is not needed.
+# Run from the repository root: python testing/vector_binding_benchmark.py
+
+import argparse
+import os
+import sys
+import time
+import numpy as np
+from dotenv import load_dotenv
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from schema import GITA_CORPUS
+from storage import PostgresStorage, rank_statement, to_pgvector
+
+def legacy_to_pgvector(embedding):
+    """The string formatting the Postgres backend used before"""
+    return "[" + ",".join(map(str, embedding)) + "]"
+
+def legacy_queries(query_vector, limit):
+    """One statement per source, the literal bound into select and order by"""
+    query_embedding = legacy_to_pgvector(query_vector)
+    return [source.rank_query(query_embedding, limit) for source in GITA_CORPUS.sources]
+
+def wire_size(statement):
+    """Bytes of SQL text psycopg2 sends once parameters are interpolated, and vector literals in it"""
+    compiled = statement.compile(dialect=postgresql.psycopg2.dialect())
+    size = len(compiled.string)
+    literals = 0
+    for name, value in compiled.params.items():
+        occurrences = compiled.string.count(f"%({name})s")
+        if isinstance(value, np.ndarray):
+            value = to_pgvector(value)
+        if isinstance(value, str) and value.startswith("["):
+            literals += occurrences
+        size += (len(str(value)) - len(f"%({name})s")) * occurrences
+    return size, literals
+
+def time_us(fn, vectors):
+    start = time.perf_counter()
+    for vector in vectors:
+        fn(vector)
+    return (time.perf_counter() - start) / len(vectors) * 1e6
+
+def percentiles(latencies):
+    return f"p50={np.percentile(latencies, 50):7.2f}ms  p95={np.percentile(latencies, 95):7.2f}ms"
+
+def client_side(vectors, limit):
+    print(f"\nFormatting one {vectors.shape[1]}-dim vector (mean over {len(vectors)}):")
+    print(f"  {'str() per element (old)':<32}{time_us(legacy_to_pgvector, vectors):8.1f}us")
+    print(f"  {'%.9g format (new)':<32}{time_us(to_pgvector, vectors):8.1f}us")
+    exact = all(np.array_equal(np.array(to_pgvector(v)[1:-1].split(","), dtype=np.float32), v) for v in vectors[:50])
+    print(f"  new literal round-trips float32 exactly: {exact}")
+
+    old = [wire_size(q) for q in legacy_queries(vectors[0], limit)]
+    new = wire_size(rank_statement(GITA_CORPUS, vectors[0], limit))
+    print(f"\nGita rank() per request:")
+    print(f"  {'':<12}{'statements':>12}{'vector literals':>17}{'SQL bytes':>12}")
+    print(f"  {'old':<12}{len(old):>12}{sum(l for _, l in old):>17}{sum(s for s, _ in old):>12}")
+    print(f"  {'new':<12}{1:>12}{new[1]:>17}{new[0]:>12}")
+
+def server_side(database_url, vectors, limit):
+    storage = PostgresStorage(database_url)
+    with storage.engine.connect() as conn:
+        # Parse cost in isolation: one statement casting the same literal 1 or 6 times
+        for copies in (1, 6):
+            statement = text("SELECT " + ", ".join(["vector_dims(CAST(:v AS vector))"] * copies))
+            latencies = []
+            for vector in vectors:
+                start = time.perf_counter()
+                conn.execute(statement, {"v": to_pgvector(vector)}).all()
+                latencies.append((time.perf_counter() - start) * 1000)
+            print(f"  {f'{copies} vector literal(s)':<32}{percentiles(latencies)}")
+
+    def legacy_rank(vector):
+        with storage.Session() as db:
+            rows = [row for query in legacy_queries(vector, limit) for row in db.execute(query)]
+        return sorted(rows, key=lambda r: r[2])
+
+    storage.rank(GITA_CORPUS, vectors[0], limit)
+    for label, rank in (("old: 3 statements, 6 literals", legacy_rank),
+                        ("new: 1 statement, 1 bind", lambda v: storage.rank(GITA_CORPUS, v, limit))):
+        latencies = []
+        for vector in vectors:
+            start = time.perf_counter()
+            rank(vector)
+            latencies.append((time.perf_counter() - start) * 1000)
+        print(f"  {label:<32}{percentiles(latencies)}")
+
+def main(samples, limit):
+    vectors = np.random.default_rng(0).normal(size=(samples, 384)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    client_side(vectors, limit)
+
+    load_dotenv()
+    database_url = os.getenv("DATABASE_URL")
+    if not database_url:
+        print("\nDATABASE_URL not set, skipping the Postgres measurements")
+        return
+    print(f"\nPostgres round trips ({samples} queries, limit={limit}):")
+    server_side(database_url, vectors, limit)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query vector binding: string literals vs one bind per statement")
+    parser.add_argument("--samples", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=5)
+    args = parser.parse_args()
+    main(args.samples, args.limit)